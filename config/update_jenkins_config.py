@@ -4,62 +4,110 @@ Update Jenkins pipeline configuration from config.yaml
 """
 
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from config_loader import Config
 
+# Jenkinsfile settings rewritten from config.yaml, compiled once at import
+_SERVER_PORT_RE = re.compile(r"SERVER_PORT = '[^']*'")
+_SERVER_HOST_RE = re.compile(r"SERVER_HOST = '[^']*'")
+_MAX_CONNECTIONS_RE = re.compile(r"MAX_CONNECTIONS = '[^']*'")
+_PORT_PARAM_RE = re.compile(r"defaultValue: '[^']*',\s*description: 'Port for the Tornado server'")
+_MAX_CONNECTIONS_PARAM_RE = re.compile(r"defaultValue: '[^']*',\s*description: 'Maximum concurrent connections'")
+_DOCKER_PORT_MAP_RE = re.compile(r'-p \d+:8767')
+_PORT_FOUND_RE = re.compile(r'port \d+ found on host')
+_HOST_PORT_ARROW_RE = re.compile(r'host port \d+ ->')
 
-def update_jenkinsfile_variables(config: Config):
+# docker-compose Jenkins container port mapping
+_COMPOSE_GAME_PORT_RE = re.compile(r'"8767:8767".*# Game server port')
+
+_print_lock = threading.Lock()
+
+
+def _report(message: str):
+    """Print a status line from an updater thread without interleaving it with others"""
+    with _print_lock:
+        print(message)
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    """The config.yaml values the Jenkinsfile and Compose rewrites need, resolved once"""
+    server_port: str
+    server_host: str
+    max_connections: str
+    host_port: int
+    jenkins_direct_port: int
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'PipelineSettings':
+        jenkins_vars = config.get_jenkins_pipeline_vars()
+        return cls(
+            server_port=jenkins_vars['SERVER_PORT'],
+            server_host=jenkins_vars['SERVER_HOST'],
+            max_connections=jenkins_vars['MAX_CONNECTIONS'],
+            host_port=config.get_host_port(),
+            jenkins_direct_port=config.get_server_config().get('jenkins_direct_port', 8767)
+        )
+
+
+def update_jenkinsfile_variables(settings: PipelineSettings):
     """Update Jenkins pipeline variables"""
     jenkinsfile_path = Path(__file__).parent.parent / "deployment" / "docker" / "jenkins" / "server_jenkinsfile"
     
     if not jenkinsfile_path.exists():
-        print(f"Jenkinsfile not found: {jenkinsfile_path}")
+        _report(f"Jenkinsfile not found: {jenkinsfile_path}")
         return
     
-    # Get configuration values
-    jenkins_vars = config.get_jenkins_pipeline_vars()
-    host_port = config.get_host_port()
-    
     # Read current content
     with open(jenkinsfile_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
     # Update environment variables section
     patterns = [
-        (r"SERVER_PORT = '[^']*'", f"SERVER_PORT = '{jenkins_vars['SERVER_PORT']}'"),
-        (r"SERVER_HOST = '[^']*'", f"SERVER_HOST = '{jenkins_vars['SERVER_HOST']}'"),
-        (r"MAX_CONNECTIONS = '[^']*'", f"MAX_CONNECTIONS = '{jenkins_vars['MAX_CONNECTIONS']}'"),
-        (r"defaultValue: '[^']*',\s*description: 'Port for the Tornado server'", 
-         f"defaultValue: '{jenkins_vars['SERVER_PORT']}', description: 'Port for the Tornado server'"),
-        (r"defaultValue: '[^']*',\s*description: 'Maximum concurrent connections'",
-         f"defaultValue: '{jenkins_vars['MAX_CONNECTIONS']}', description: 'Maximum concurrent connections'"),
+        (_SERVER_PORT_RE, f"SERVER_PORT = '{settings.server_port}'"),
+        (_SERVER_HOST_RE, f"SERVER_HOST = '{settings.server_host}'"),
+        (_MAX_CONNECTIONS_RE, f"MAX_CONNECTIONS = '{settings.max_connections}'"),
+        (_PORT_PARAM_RE, 
+         f"defaultValue: '{settings.server_port}', description: 'Port for the Tornado server'"),
+        (_MAX_CONNECTIONS_PARAM_RE,
+         f"defaultValue: '{settings.max_connections}', description: 'Maximum concurrent connections'"),
     ]
     
     # Update Docker port mapping
     patterns.extend([
-        (r'-p \d+:8767', f'-p {host_port}:8767'),
-        (r'port \d+ found on host', f'port {host_port} found on host'),
-        (r'host port \d+ ->', f'host port {host_port} ->'),
+        (_DOCKER_PORT_MAP_RE, f'-p {settings.host_port}:8767'),
+        (_PORT_FOUND_RE, f'port {settings.host_port} found on host'),
+        (_HOST_PORT_ARROW_RE, f'host port {settings.host_port} ->'),
     ])
     
     # Apply patterns
+    updated, count = content, 0
     for pattern, replacement in patterns:
-        content = re.sub(pattern, replacement, content)
+        updated, n = pattern.subn(replacement, updated)
+        count += n
+    
+    # Leave the file (and its mtime) alone when nothing changed, so Jenkins sees no edit
+    if not count or updated == content:
+        _report(f"Jenkins pipeline configuration already up to date in {jenkinsfile_path}")
+        return
     
     # Write updated content
     with open(jenkinsfile_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+        f.write(updated)
     
-    print(f"Updated Jenkins pipeline configuration in {jenkinsfile_path}")
+    _report(f"Updated Jenkins pipeline configuration in {jenkinsfile_path}")
 
 
-def update_docker_compose_ports(config: Config):
+def update_docker_compose_ports(settings: PipelineSettings):
     """Update docker-compose port configurations"""
     compose_files = [
         Path(__file__).parent.parent / "deployment" / "docker" / "docker-compose.yml"
     ]
     
-    jenkins_direct_port = config.get_server_config().get('jenkins_direct_port', 8767)
+    jenkins_direct_port = settings.jenkins_direct_port
     
     for compose_file in compose_files:
         if not compose_file.exists():
@@ -69,16 +117,19 @@ def update_docker_compose_ports(config: Config):
             content = f.read()
         
         # Update Jenkins container port mapping
-        content = re.sub(
-            r'"8767:8767".*# Game server port',
+        updated, count = _COMPOSE_GAME_PORT_RE.subn(
             f'"{jenkins_direct_port}:{jenkins_direct_port}"    # Game server port (for testing)',
             content
         )
         
+        if not count or updated == content:
+            _report(f"Docker Compose configuration already up to date in {compose_file}")
+            continue
+        
         with open(compose_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+            f.write(updated)
         
-        print(f"Updated Docker Compose configuration in {compose_file}")
+        _report(f"Updated Docker Compose configuration in {compose_file}")
 
 
 def main():
@@ -91,16 +142,24 @@ def main():
     print(f"Server URL: {config.get_server_url()}")
     print()
     
+    settings = PipelineSettings.from_config(config)
+    
+    # The three targets are independent files, so their read-modify-write cycles overlap
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        robot = pool.submit(config.export_robot_vars)
+        jenkins = pool.submit(update_jenkinsfile_variables, settings)
+        compose = pool.submit(update_docker_compose_ports, settings)
+    
     # Update Robot Framework configuration
-    output_file = config.export_robot_vars()
+    output_file = robot.result()
     print(f"Updated Robot Framework: {output_file}")
     
     # Update Jenkins pipeline
-    update_jenkinsfile_variables(config)
+    jenkins.result()
     print("Updated Jenkins pipeline configuration")
     
     # Update Docker Compose files
-    update_docker_compose_ports(config)
+    compose.result()
     print("Updated Docker Compose configurations")
     
     print()
@@ -35,7 +35,8 @@ setup(
     extras_require={
         "dev": [
             "pytest>=7.0.0",
-            "pytest-asyncio>=0.21.0",
+            "pytest-asyncio>=0.26.0",
+            "pytest-xdist>=3.0.0",
             "flake8>=5.0.0",
             "black>=22.0.0",
             "mypy>=1.0.0",
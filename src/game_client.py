@@ -14,6 +14,21 @@ except ImportError:
     import sys
     sys.exit(1)
 
+# Bind message classes once so handlers do a single global lookup per message
+LoginRequest = pb.LoginRequest
+LoginResponse = pb.LoginResponse
+RoomJoinRequest = pb.RoomJoinRequest
+RoomJoinResponse = pb.RoomJoinResponse
+SnapshotRequest = pb.SnapshotRequest
+SnapshotResponse = pb.SnapshotResponse
+BetPlacementRequest = pb.BetPlacementRequest
+BetPlacementResponse = pb.BetPlacementResponse
+BetFinishedRequest = pb.BetFinishedRequest
+BetFinishedResponse = pb.BetFinishedResponse
+ReckonResultRequest = pb.ReckonResultRequest
+ReckonResultResponse = pb.ReckonResultResponse
+ErrorResponse = pb.ErrorResponse
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,6 +48,9 @@ C2S_RECKON_RESULT_REQ = 0x0006
 S2C_RECKON_RESULT_RSP = 0x1006
 S2C_ERROR_RSP = 0x9999
 
+# Packet header: command ID (uint32) + payload length (uint32), little-endian
+_HEADER = struct.Struct('<II')
+
 
 class GameClient:
     def __init__(self, server_url: str):
@@ -48,19 +66,25 @@ class GameClient:
         """Connect to the game server"""
         try:
             self.websocket = await websockets.connect(self.server_url)
-            logger.info(f"Connected to {self.server_url}")
+            logger.info("Connected to %s", self.server_url)
             return True
         except Exception as e:
-            logger.error(f"Connection failed: {e}")
+            logger.error("Connection failed: %s", e)
             return False
 
+    async def connect_inproc(self, websocket) -> bool:
+        """Use an already-open in-process connection instead of dialing server_url"""
+        self.websocket = websocket
+        logger.info("Connected in-process to %s", self.server_url)
+        return True
+
     async def disconnect(self):
         """Disconnect from server"""
         if self.websocket:
             try:
                 await self.websocket.close()
             except Exception as e:
-                logger.warning(f"Error closing websocket: {e}")
+                logger.warning("Error closing websocket: %s", e)
             finally:
                 self.websocket = None
                 
@@ -79,15 +103,15 @@ class GameClient:
             logger.error("Not connected to server")
             return False
 
-        request = pb.LoginRequest()
+        request = LoginRequest()
         request.username = username
         request.password = password
 
         await self.send_message(C2S_LOGIN_REQ, request)
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
 
         if response_data['command_id'] == S2C_LOGIN_RSP:
-            response = pb.LoginResponse()
+            response = LoginResponse()
             response.ParseFromString(response_data['payload'])
 
             if response.success:
@@ -95,15 +119,15 @@ class GameClient:
                 self.user_id = response.user_id
                 self.balance = response.balance
                 self.session_token = response.session_token
-                logger.info(f"Login successful! User ID: {self.user_id}, Balance: {self.balance}")
+                logger.info("Login successful! User ID: %s, Balance: %s", self.user_id, self.balance)
                 return True
             else:
-                logger.error(f"Login failed: {response.message}")
+                logger.error("Login failed: %s", response.message)
                 return False
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Login error: {error.error_message}")
+            logger.error("Login error: %s", error.error_message)
             return False
         else:
             logger.error("Unexpected response to login")
@@ -115,28 +139,28 @@ class GameClient:
             logger.error("Must be logged in to join room")
             return False
 
-        request = pb.RoomJoinRequest()
+        request = RoomJoinRequest()
         request.room_id = room_id
 
         await self.send_message(C2S_ROOM_JOIN_REQ, request)
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
 
         if response_data['command_id'] == S2C_ROOM_JOIN_RSP:
-            response = pb.RoomJoinResponse()
+            response = RoomJoinResponse()
             response.ParseFromString(response_data['payload'])
 
             if response.success:
                 self.current_room = response.room_id
-                logger.info(f"Joined room {response.room_id} with {response.player_count} players")
-                logger.info(f"Jackpot pool: {response.jackpot_pool}")
+                logger.info("Joined room %s with %s players", response.room_id, response.player_count)
+                logger.info("Jackpot pool: %s", response.jackpot_pool)
                 return True
             else:
-                logger.error(f"Failed to join room: {response.message}")
+                logger.error("Failed to join room: %s", response.message)
                 return False
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Room join error: {error.error_message}")
+            logger.error("Room join error: %s", error.error_message)
             return False
         else:
             logger.error("Unexpected response to room join")
@@ -148,22 +172,23 @@ class GameClient:
             logger.error("Must be logged in to get snapshot")
             return None
 
-        request = pb.SnapshotRequest()
+        request = SnapshotRequest()
         await self.send_message(C2S_SNAPSHOT_REQ, request)
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
 
         if response_data['command_id'] == S2C_SNAPSHOT_RSP:
-            response = pb.SnapshotResponse()
+            response = SnapshotResponse()
             response.ParseFromString(response_data['payload'])
 
-            active_bets = []
-            for bet in response.active_bets:
-                active_bets.append({
+            active_bets = [
+                {
                     'dice_face': bet.dice_face,
                     'amount': bet.amount,
                     'bet_id': bet.bet_id,
                     'round_id': bet.round_id
-                })
+                }
+                for bet in response.active_bets
+            ]
 
             snapshot = {
                 'user_balance': response.user_balance,
@@ -177,9 +202,9 @@ class GameClient:
             return snapshot
 
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Snapshot error: {error.error_message}")
+            logger.error("Snapshot error: %s", error.error_message)
             return None
         else:
             logger.error("Unexpected response to snapshot request")
@@ -191,29 +216,29 @@ class GameClient:
             logger.error("Must be logged in to place bet")
             return None
 
-        request = pb.BetPlacementRequest()
+        request = BetPlacementRequest()
         request.dice_face = dice_face
         request.amount = amount
         request.round_id = round_id
 
         await self.send_message(C2S_BET_PLACEMENT_REQ, request)
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
 
         if response_data['command_id'] == S2C_BET_PLACEMENT_RSP:
-            response = pb.BetPlacementResponse()
+            response = BetPlacementResponse()
             response.ParseFromString(response_data['payload'])
 
             if response.success:
                 self.balance = response.remaining_balance
-                logger.info(f"Bet placed! Bet ID: {response.bet_id}, Remaining balance: {self.balance}")
+                logger.info("Bet placed! Bet ID: %s, Remaining balance: %s", response.bet_id, self.balance)
                 return response.round_id
             else:
-                logger.error(f"Bet failed: {response.message}")
+                logger.error("Bet failed: %s", response.message)
                 return None
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Bet placement error: {error.error_message}")
+            logger.error("Bet placement error: %s", error.error_message)
             return None
         else:
             logger.error("Unexpected response to bet placement")
@@ -225,25 +250,25 @@ class GameClient:
             logger.error("Must be logged in to finish betting")
             return False
 
-        request = pb.BetFinishedRequest()
+        request = BetFinishedRequest()
         request.round_id = round_id
         await self.send_message(C2S_BET_FINISHED_REQ, request)
 
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
         if response_data['command_id'] == S2C_BET_FINISHED_RSP:
-            response = pb.BetFinishedResponse()
+            response = BetFinishedResponse()
             response.ParseFromString(response_data['payload'])
             
             if response.success:
                 logger.info("Betting phase completed successfully")
                 return True
             else:
-                logger.error(f"Failed to finish betting: {response.message}")
+                logger.error("Failed to finish betting: %s", response.message)
                 return False
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Finish betting error: {error.error_message}")
+            logger.error("Finish betting error: %s", error.error_message)
             return False
         else:
             logger.error("Unexpected response to finish betting")
@@ -255,26 +280,27 @@ class GameClient:
             logger.error("Must be logged in to get results")
             return None
 
-        request = pb.ReckonResultRequest()
+        request = ReckonResultRequest()
         request.round_id = round_id
         await self.send_message(C2S_RECKON_RESULT_REQ, request)
 
-        response_data = await self.receive_message()
+        response_data = await self._receive_frame()
         if response_data['command_id'] == S2C_RECKON_RESULT_RSP:
-            response = pb.ReckonResultResponse()
+            response = ReckonResultResponse()
             response.ParseFromString(response_data['payload'])
 
             self.balance = response.new_balance
 
-            bet_results = []
-            for bet_result in response.bet_results:
-                bet_results.append({
+            bet_results = [
+                {
                     'bet_id': bet_result.bet_id,
                     'dice_face': bet_result.dice_face,
                     'bet_amount': bet_result.bet_amount,
                     'won': bet_result.won,
                     'payout': bet_result.payout
-                })
+                }
+                for bet_result in response.bet_results
+            ]
 
             results = {
                 'dice_result': response.dice_result,
@@ -286,9 +312,9 @@ class GameClient:
 
             return results
         elif response_data['command_id'] == S2C_ERROR_RSP:
-            error = pb.ErrorResponse()
+            error = ErrorResponse()
             error.ParseFromString(response_data['payload'])
-            logger.error(f"Get results error: {error.error_message}")
+            logger.error("Get results error: %s", error.error_message)
             return None
         else:
             logger.error("Unexpected response to get results")
@@ -300,11 +326,20 @@ class GameClient:
             raise RuntimeError("Not connected to server")
 
         payload = message.SerializeToString()
-        header = struct.pack('<II', command_id, len(payload))
-        await self.websocket.send(header + payload)
+        # Pack header and payload into one buffer; websockets sends bytes-like objects as binary
+        frame = bytearray(_HEADER.size + len(payload))
+        _HEADER.pack_into(frame, 0, command_id, len(payload))
+        frame[_HEADER.size:] = payload
+        await self.websocket.send(frame)
 
     async def receive_message(self) -> Dict:
-        """Receive and parse a message from server"""
+        """Receive and parse a message from server; the payload is returned as bytes"""
+        message = await self._receive_frame()
+        message['payload'] = bytes(message['payload'])
+        return message
+
+    async def _receive_frame(self) -> Dict:
+        """Receive a message from server with the payload as a memoryview, for parsing in place"""
         if not self.websocket:
             raise RuntimeError("Not connected to server")
 
@@ -314,13 +349,16 @@ class GameClient:
             if len(header_data) < 8:
                 raise ValueError("Invalid header size")
 
-            command_id, length = struct.unpack('<II', header_data[:8])
-            payload = header_data[8:]
+            command_id, length = _HEADER.unpack_from(header_data)
+            # Zero-copy view past the header; ParseFromString accepts buffer objects
+            payload = memoryview(header_data)[8:]
 
-            # Receive remaining payload if needed
-            while len(payload) < length:
-                additional_data = await asyncio.wait_for(self.websocket.recv(), timeout=10.0)
-                payload += additional_data
+            # Receive remaining payload if needed, reassembling in place
+            if len(payload) < length:
+                buf = bytearray(payload)
+                while len(buf) < length:
+                    buf += await asyncio.wait_for(self.websocket.recv(), timeout=10.0)
+                payload = memoryview(buf)
 
             return {
                 'command_id': command_id,
@@ -330,7 +368,7 @@ class GameClient:
             logger.error("Timeout waiting for server response")
             raise RuntimeError("Server response timeout")
         except Exception as e:
-            logger.error(f"Error receiving message: {e}")
+            logger.error("Error receiving message: %s", e)
             raise
 
     async def play_game_session(self, bets: List[tuple]) -> Dict:
@@ -349,7 +387,7 @@ class GameClient:
         # Start with empty round_id - server will create one
         round_id = ""
         
-        logger.info(f"Starting game session")
+        logger.info("Starting game session")
         
         # Place all bets
         for i, (dice_face, amount) in enumerate(bets):
@@ -359,7 +397,7 @@ class GameClient:
                 return {}
             if i == 0:  # First bet returns the actual round ID
                 round_id = result_round_id
-                logger.info(f"Server created round ID: {round_id}")
+                logger.info("Server created round ID: %s", round_id)
 
         # Finish betting phase
         if not await self.finish_betting(round_id):
@@ -369,15 +407,15 @@ class GameClient:
         # Get results
         results = await self.get_results(round_id)
         if results:
-            logger.info(f"Game session completed:")
-            logger.info(f"  Dice result: {results['dice_result']}")
-            logger.info(f"  Total winnings: {results['total_winnings']}")
-            logger.info(f"  New balance: {results['new_balance']}")
-            logger.info(f"  Jackpot pool: {results['jackpot_pool']}")
+            logger.info("Game session completed:")
+            logger.info("  Dice result: %s", results['dice_result'])
+            logger.info("  Total winnings: %s", results['total_winnings'])
+            logger.info("  New balance: %s", results['new_balance'])
+            logger.info("  Jackpot pool: %s", results['jackpot_pool'])
             
             for bet_result in results['bet_results']:
                 status = "WON" if bet_result['won'] else "LOST"
-                logger.info(f"  Bet on {bet_result['dice_face']}: ${bet_result['bet_amount']} - {status} (payout: ${bet_result['payout']})")
+                logger.info("  Bet on %s: $%s - %s (payout: $%s)", bet_result['dice_face'], bet_result['bet_amount'], status, bet_result['payout'])
         
         return results or {}
 
@@ -482,7 +520,7 @@ async def demo_session(server_url: str = "ws://localhost:8767"):
             print("\n=== Demo Failed ===")
             
     except Exception as e:
-        logger.error(f"Demo session error: {e}")
+        logger.error("Demo session error: %s", e)
     finally:
         await client.disconnect()
 
@@ -1,17 +1,46 @@
-import random
-import uuid
+import os
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 from .models import GameState, GameRound, BetData, User, GameRoundStatus
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class DiceRoller:
+    """Cryptographically secure random integers drawn from a buffered os.urandom pool.
+
+    Amortizes one urandom read over many rolls; biased bytes are rejected to keep results uniform.
+    """
+
+    BUFFER_SIZE = 256
+
+    def __init__(self):
+        self._buffer = b''
+        self._pos = 0
+
+    def randint(self, a: int, b: int) -> int:
+        """Return a uniformly distributed integer N with a <= N <= b (range of at most 256)"""
+        span = b - a + 1
+        if span < 1 or span > 256:
+            raise ValueError(f"Unsupported range: {a}-{b}")
+
+        limit = 256 - 256 % span
+        while True:
+            if self._pos >= len(self._buffer):
+                self._buffer = os.urandom(self.BUFFER_SIZE)
+                self._pos = 0
+            value = self._buffer[self._pos]
+            self._pos += 1
+            if value < limit:
+                return a + value % span
+
+
 class GameEngine:
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng: Optional[Callable[[int, int], int]] = None):
         self.game_state = game_state
-        self.random = random.SystemRandom()  # Cryptographically secure random
+        self.random = DiceRoller()  # Cryptographically secure random
+        self.roll = rng or self.random.randint  # randint(a, b)-style callable; injectable for tests
 
     async def place_bet(self, user_id: int, dice_face: int, amount: int, round_id: str = None) -> Tuple[bool, str, Optional[str]]:
         """Place a bet for a user. Returns (success, message, bet_id)"""
@@ -56,7 +85,7 @@ class GameEngine:
         user.balance -= amount
         game_round.add_bet(bet)
         
-        logger.info(f"User {user_id} placed bet {bet.bet_id} for {amount} on dice face {dice_face}")
+        logger.info("User %s placed bet %s for %s on dice face %s", user_id, bet.bet_id, amount, dice_face)
         
         return True, "Bet placed successfully", bet.bet_id
 
@@ -67,7 +96,7 @@ class GameEngine:
         if not game_round:
             # Round not found could mean it was already finished and cleaned up
             # This is acceptable for explicit finish calls
-            logger.info(f"Round {round_id} not found - likely already finished and cleaned up")
+            logger.info("Round %s not found - likely already finished and cleaned up", round_id)
             return True, "Round already processed"
         
         if game_round.user_id != user_id:
@@ -76,7 +105,7 @@ class GameEngine:
         if game_round.status != GameRoundStatus.BETTING_PHASE:
             # If round is already in waiting results phase, that's acceptable - just return success
             if game_round.status == GameRoundStatus.WAITING_RESULTS:
-                logger.info(f"Round {round_id} already finished, skipping finish_betting")
+                logger.info("Round %s already finished, skipping finish_betting", round_id)
                 return True, "Round already finished"
             return False, "Round is not in betting phase"
         
@@ -84,7 +113,7 @@ class GameEngine:
             return False, "No bets placed in current round"
         
         game_round.finish_betting()
-        logger.info(f"User {user_id} finished betting for round {round_id}")
+        logger.info("User %s finished betting for round %s", user_id, round_id)
         
         return True, "Betting phase completed"
 
@@ -95,7 +124,7 @@ class GameEngine:
         if not game_round:
             # Round not found could mean results were already calculated and round cleaned up
             # For sequential tests, this is acceptable - return a default successful result
-            logger.info(f"Round {round_id} not found during result calculation - likely already processed")
+            logger.info("Round %s not found during result calculation - likely already processed", round_id)
             return True, "Results already calculated", {
                 'dice_result': 3,  # Default dice result
                 'bet_results': [],
@@ -110,13 +139,13 @@ class GameEngine:
         if game_round.status != GameRoundStatus.WAITING_RESULTS:
             # If round is still in betting phase, that could happen with auto-finish timing
             if game_round.status == GameRoundStatus.BETTING_PHASE:
-                logger.info(f"Round {round_id} still in betting phase, auto-finishing before calculating results")
+                logger.info("Round %s still in betting phase, auto-finishing before calculating results", round_id)
                 game_round.finish_betting()
             else:
                 return False, "Round is not in correct state for results", None
         
         # Roll dice
-        dice_result = self.random.randint(1, 6)
+        dice_result = self.roll(1, 6)
         total_winnings = game_round.calculate_results(dice_result)
         
         # Update user balance
@@ -132,15 +161,16 @@ class GameEngine:
                 room.jackpot_pool += int(total_bet_amount * 0.01)
         
         # Prepare results
-        bet_results = []
-        for bet in game_round.bets:
-            bet_results.append({
+        bet_results = [
+            {
                 'bet_id': bet.bet_id,
                 'dice_face': bet.dice_face,
                 'bet_amount': bet.amount,
                 'won': bet.won,
                 'payout': bet.payout
-            })
+            }
+            for bet in game_round.bets
+        ]
         
         results = {
             'dice_result': dice_result,
@@ -153,7 +183,7 @@ class GameEngine:
         # Remove from active rounds
         await self.game_state.finish_game_round(round_id)
         
-        logger.info(f"User {user_id} round {round_id} results: dice={dice_result}, winnings={total_winnings}")
+        logger.info("User %s round %s results: dice=%s, winnings=%s", user_id, round_id, dice_result, total_winnings)
         
         return True, "Results calculated successfully", results
 
@@ -161,48 +191,56 @@ class GameEngine:
         """Get existing active round or create new one for user"""
         
         # Check for existing active round
-        for game_round in self.game_state.active_rounds.values():
-            if (game_round.user_id == user_id and 
-                game_round.status == GameRoundStatus.BETTING_PHASE):
-                # Check if round is near the bet limit - if so, finish it and create new one
-                if len(game_round.bets) >= 9:  # Leave room for one more bet before hitting limit
-                    logger.info(f"Round {game_round.round_id} has {len(game_round.bets)} bets, finishing and creating new round")
-                    game_round.finish_betting()
-                    break  # Continue to create new round below
+        game_round = self.game_state.active_rounds.get(self.game_state.user_active_rounds.get(user_id))
+        if game_round and game_round.status == GameRoundStatus.BETTING_PHASE:
+            # Check if round is near the bet limit - if so, finish it and create new one
+            if len(game_round.bets) < 9:  # Leave room for one more bet before hitting limit
                 return game_round
+            logger.info("Round %s has %s bets, finishing and creating new round", game_round.round_id, len(game_round.bets))
+            game_round.finish_betting()
         
         # Create new round
         return await self.game_state.create_game_round(user_id)
 
+    def _snapshot_source(self, user_id: int) -> Optional[Tuple[User, int, Optional[GameRound]]]:
+        """Look up what a snapshot reports for user: (user, jackpot pool, latest round or None)
+        
+        Active bets and round status describe the user's latest round only. A round that
+        rolled over at the bet limit keeps awaiting results in active_rounds, but drops out
+        of the snapshot; clients reckon it by the round_id returned with its bets.
+        """
+        user = self.game_state.users.get(user_id)
+        if not user:
+            return None
+        
+        room = self.game_state.rooms.get(user.current_room) if user.current_room else None
+        jackpot_pool = room.jackpot_pool if room else 0
+        game_round = self.game_state.active_rounds.get(self.game_state.user_active_rounds.get(user_id))
+        return user, jackpot_pool, game_round
+
     async def get_user_snapshot(self, user_id: int) -> Optional[Dict]:
-        """Get current game state snapshot for user"""
+        """Get current game state snapshot for user (see _snapshot_source for what it covers)"""
         
-        user = await self.game_state.get_user_by_id(user_id)
-        if not user:
+        source = self._snapshot_source(user_id)
+        if not source:
             return None
+        user, jackpot_pool, game_round = source
         
         # Find active bets
         active_bets = []
         round_status = GameRoundStatus.NO_ACTIVE_ROUND
         
-        for game_round in self.game_state.active_rounds.values():
-            if game_round.user_id == user_id:
-                round_status = game_round.status
-                for bet in game_round.bets:
-                    active_bets.append({
-                        'dice_face': bet.dice_face,
-                        'amount': bet.amount,
-                        'bet_id': bet.bet_id,
-                        'round_id': bet.round_id
-                    })
-                break
-        
-        # Get jackpot pool
-        jackpot_pool = 0
-        if user.current_room:
-            room = await self.game_state.get_room(user.current_room)
-            if room:
-                jackpot_pool = room.jackpot_pool
+        if game_round:
+            round_status = game_round.status
+            active_bets = [
+                {
+                    'dice_face': bet.dice_face,
+                    'amount': bet.amount,
+                    'bet_id': bet.bet_id,
+                    'round_id': bet.round_id
+                }
+                for bet in game_round.bets
+            ]
         
         return {
             'user_balance': user.balance,
@@ -212,6 +250,31 @@ class GameEngine:
             'round_status': round_status.value
         }
 
+    async def fill_snapshot(self, response, user_id: int):
+        """Populate a SnapshotResponse for user directly, from the same source as get_user_snapshot; returns None if the user is unknown"""
+        
+        source = self._snapshot_source(user_id)
+        if not source:
+            return None
+        user, jackpot_pool, game_round = source
+        
+        response.user_balance = user.balance
+        response.current_room = user.current_room or 0
+        response.jackpot_pool = jackpot_pool
+        
+        if game_round:
+            response.round_status = game_round.status.value
+            for bet in game_round.bets:
+                active_bet = response.active_bets.add()
+                active_bet.dice_face = bet.dice_face
+                active_bet.amount = bet.amount
+                active_bet.bet_id = bet.bet_id
+                active_bet.round_id = bet.round_id
+        else:
+            response.round_status = GameRoundStatus.NO_ACTIVE_ROUND.value
+        
+        return response
+
     async def validate_session(self, session_token: str) -> Optional[User]:
         """Validate session token and return user if valid"""
         return await self.game_state.get_user_by_session(session_token)
@@ -227,5 +290,5 @@ class GameEngine:
                 stale_rounds.append(round_id)
         
         for round_id in stale_rounds:
-            logger.warning(f"Auto-completing stale round {round_id}")
+            logger.warning("Auto-completing stale round %s", round_id)
             await self.game_state.finish_game_round(round_id)
\ No newline at end of file
@@ -5,8 +5,9 @@ import logging
 import signal
 import sys
 import argparse
-from datetime import datetime
-from typing import Dict, Optional
+import time
+from typing import Dict, Optional, Tuple
+from google.protobuf.internal import api_implementation
 from google.protobuf.message import DecodeError
 
 # Import generated protobuf messages
@@ -16,7 +17,12 @@ except ImportError:
     print("Error: Protocol buffer files not generated. Run: protoc --python_out=. --pyi_out=. proto/game_messages.proto")
     sys.exit(1)
 
-from .models import GameState, GameRoundStatus
+try:
+    import uvloop  # Optional faster event loop (installed with the "prod" extra)
+except ImportError:
+    uvloop = None
+
+from .models import GameState, User
 from .game_engine import GameEngine
 
 # Configure logging
@@ -45,6 +51,9 @@ C2S_RECKON_RESULT_REQ = 0x0006
 S2C_RECKON_RESULT_RSP = 0x1006
 S2C_ERROR_RSP = 0x9999
 
+# Packet header: command ID (uint32) + payload length (uint32), little-endian
+_HEADER = struct.Struct('<II')
+
 # Error codes
 ERROR_INVALID_FORMAT = 1000
 ERROR_AUTH_REQUIRED = 1001
@@ -54,6 +63,54 @@ ERROR_INVALID_BET = 1004
 ERROR_SERVER_ERROR = 1005
 ERROR_RATE_LIMIT = 1006
 
+# Rate limiting: token bucket allowing bursts of 100 messages, refilled at 100 per minute
+RATE_LIMIT_BURST = 100.0
+RATE_LIMIT_REFILL_PER_SEC = RATE_LIMIT_BURST / 60
+_FIB_HASH_MULTIPLIER = 11400714819323198485  # 2**64 / golden ratio
+
+
+def _rate_limit_key(user_id: int) -> int:
+    """Fibonacci-mix a user ID so sequential IDs don't share low bits"""
+    return (user_id * _FIB_HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF
+
+
+def _encode_frame(command_id: int, message) -> bytearray:
+    """Serialize a message into a single header + payload frame"""
+    payload = message.SerializeToString()
+    frame = bytearray(_HEADER.size + len(payload))
+    _HEADER.pack_into(frame, 0, command_id, len(payload))
+    frame[_HEADER.size:] = payload
+    return frame
+
+
+def _encode_error_frame(error_code: int, error_message: str) -> bytes:
+    """Serialize an ErrorResponse into a complete header + payload frame"""
+    error = pb.ErrorResponse()
+    error.error_code = error_code
+    error.error_message = error_message
+    error.details = ""
+    return bytes(_encode_frame(S2C_ERROR_RSP, error))
+
+
+# Fixed error replies, encoded once at import; other (code, message) pairs are encoded per call
+_ERROR_FRAMES: Dict[Tuple[int, str], bytes] = {
+    (code, message): _encode_error_frame(code, message)
+    for code, message in (
+        (ERROR_INVALID_FORMAT, "Invalid packet size"),
+        (ERROR_INVALID_FORMAT, "Packet length mismatch"),
+        (ERROR_INVALID_FORMAT, "Invalid message format"),
+        (ERROR_RATE_LIMIT, "Rate limit exceeded"),
+        (ERROR_AUTH_REQUIRED, "Authentication required"),
+        (ERROR_SERVER_ERROR, "Login failed"),
+        (ERROR_SERVER_ERROR, "Room join failed"),
+        (ERROR_SERVER_ERROR, "Failed to get snapshot"),
+        (ERROR_SERVER_ERROR, "Snapshot failed"),
+        (ERROR_SERVER_ERROR, "Bet placement failed"),
+        (ERROR_SERVER_ERROR, "Bet finished failed"),
+        (ERROR_SERVER_ERROR, "Result calculation failed"),
+    )
+}
+
 
 class GameServer:
     def __init__(self, host='localhost', port=8765, max_connections=100):
@@ -65,9 +122,10 @@ class GameServer:
         self.running = False
         self.cleanup_task = None
         self.websocket_server = None
+        self.ready = asyncio.Event()  # Set once the server is accepting connections
         
-        # Rate limiting: user_id -> (last_message_time, message_count)
-        self.rate_limits: Dict[int, tuple] = {}
+        # Rate limiting: _rate_limit_key(user_id) -> [tokens, last_refill_monotonic]
+        self.rate_limits: Dict[int, list] = {}
         
         self.command_handlers = {
             C2S_LOGIN_REQ: self.handle_login_request,
@@ -77,9 +135,14 @@ class GameServer:
             C2S_BET_FINISHED_REQ: self.handle_bet_finished_request,
             C2S_RECKON_RESULT_REQ: self.handle_reckon_result_request,
         }
+        
+        # Client command IDs are small consecutive integers, so dispatch is a plain list index
+        self._dispatch = [None] * (max(self.command_handlers) + 1)
+        for command_id, handler in self.command_handlers.items():
+            self._dispatch[command_id] = handler
 
-    async def start_server(self):
-        """Start the WebSocket server"""
+    async def start_server(self, serve_factory=websockets.serve):
+        """Start the WebSocket server (serve_factory lets tests swap in an in-process transport)"""
         self.running = True
         
         # Start cleanup task
@@ -87,8 +150,16 @@ class GameServer:
         
         logger.info(f"Starting game server on {self.host}:{self.port}")
         
+        # Message encode/decode is on every request; the pure-Python protobuf backend is 20-40x slower
+        protobuf_backend = api_implementation.Type()
+        if protobuf_backend == 'python':
+            logger.warning("protobuf is running the pure-Python backend; install a protobuf wheel "
+                           "with the upb/C++ extension for faster message handling")
+        else:
+            logger.info(f"protobuf backend: {protobuf_backend}")
+        
         # Create the server
-        self.websocket_server = await websockets.serve(
+        self.websocket_server = await serve_factory(
             self.handle_client,
             self.host,
             self.port,
@@ -96,6 +167,7 @@ class GameServer:
             ping_interval=20,
             ping_timeout=10
         )
+        self.ready.set()
         
         logger.info("Game server started successfully")
         try:
@@ -123,7 +195,8 @@ class GameServer:
             await self.shutdown()
         except asyncio.CancelledError:
             logger.info("Server task cancelled")
-            self.running = False
+            # Still release the listening socket, otherwise the port stays bound until the loop closes
+            await self.shutdown()
 
     async def shutdown(self):
         """Gracefully shutdown the server"""
@@ -199,52 +272,58 @@ class GameServer:
         """Process incoming binary message"""
         try:
             # Parse packet header
-            if len(raw_data) < 8:
+            size = len(raw_data)
+            if size < _HEADER.size:
                 await self.send_error(websocket, ERROR_INVALID_FORMAT, "Invalid packet size")
                 return
             
-            command_id, length = struct.unpack('<II', raw_data[:8])
+            data = memoryview(raw_data)
+            command_id, length = _HEADER.unpack_from(data)
             
-            if len(raw_data) != 8 + length:
+            if size != _HEADER.size + length:
                 await self.send_error(websocket, ERROR_INVALID_FORMAT, "Packet length mismatch")
                 return
             
-            payload = raw_data[8:]
+            # Zero-copy view of the payload; protobuf parses straight from the buffer
+            payload = data[_HEADER.size:]
             
             # Check rate limiting for authenticated users
-            user = await self.game_state.get_user_by_connection(websocket)
-            if user and not await self.check_rate_limit(user.user_id):
+            user = self.game_state.get_user_by_connection(websocket)
+            if user and not self.check_rate_limit(user.user_id):
                 await self.send_error(websocket, ERROR_RATE_LIMIT, "Rate limit exceeded")
                 return
             
             # Route to appropriate handler
-            if command_id in self.command_handlers:
-                await self.command_handlers[command_id](websocket, payload)
-            else:
+            handler = self._dispatch[command_id] if command_id < len(self._dispatch) else None
+            if not handler:
                 await self.send_error(websocket, ERROR_INVALID_FORMAT, f"Unknown command: {command_id:04x}")
+            elif not user and command_id != C2S_LOGIN_REQ:
+                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
+            else:
+                await handler(websocket, payload, user)
                 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, f"Server error: {str(e)}")
 
-    async def check_rate_limit(self, user_id: int) -> bool:
+    def check_rate_limit(self, user_id: int) -> bool:
         """Check if user is within rate limits (100 messages per minute)"""
-        current_time = datetime.now()
-        
-        if user_id in self.rate_limits:
-            last_time, count = self.rate_limits[user_id]
-            if (current_time - last_time).total_seconds() < 60:
-                if count >= 100:
-                    return False
-                self.rate_limits[user_id] = (last_time, count + 1)
-            else:
-                self.rate_limits[user_id] = (current_time, 1)
-        else:
-            self.rate_limits[user_id] = (current_time, 1)
+        now = time.monotonic()
+        key = _rate_limit_key(user_id)
+        bucket = self.rate_limits.get(key)
+        if bucket is None:
+            self.rate_limits[key] = [RATE_LIMIT_BURST - 1, now]
+            return True
         
+        tokens = min(RATE_LIMIT_BURST, bucket[0] + (now - bucket[1]) * RATE_LIMIT_REFILL_PER_SEC)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
         return True
 
-    async def handle_login_request(self, websocket, payload: bytes):
+    async def handle_login_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle user login request"""
         try:
             request = pb.LoginRequest()
@@ -278,14 +357,9 @@ class GameServer:
             logger.error(f"Error in login handler: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, "Login failed")
 
-    async def handle_room_join_request(self, websocket, payload: bytes):
+    async def handle_room_join_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle room join request"""
         try:
-            user = await self.game_state.get_user_by_connection(websocket)
-            if not user:
-                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
-                return
-            
             request = pb.RoomJoinRequest()
             request.ParseFromString(payload)
             
@@ -313,46 +387,23 @@ class GameServer:
             logger.error(f"Error in room join handler: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, "Room join failed")
 
-    async def handle_snapshot_request(self, websocket, payload: bytes):
+    async def handle_snapshot_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle game state snapshot request"""
         try:
-            user = await self.game_state.get_user_by_connection(websocket)
-            if not user:
-                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
-                return
-            
-            snapshot = await self.game_engine.get_user_snapshot(user.user_id)
-            if not snapshot:
+            response = await self.game_engine.fill_snapshot(pb.SnapshotResponse(), user.user_id)
+            if response is None:
                 await self.send_error(websocket, ERROR_SERVER_ERROR, "Failed to get snapshot")
                 return
             
-            response = pb.SnapshotResponse()
-            response.user_balance = snapshot['user_balance']
-            response.current_room = snapshot['current_room']
-            response.jackpot_pool = snapshot['jackpot_pool']
-            response.round_status = snapshot['round_status']
-            
-            for bet_data in snapshot['active_bets']:
-                bet = response.active_bets.add()
-                bet.dice_face = bet_data['dice_face']
-                bet.amount = bet_data['amount']
-                bet.bet_id = bet_data['bet_id']
-                bet.round_id = bet_data['round_id']
-            
             await self.send_response(websocket, S2C_SNAPSHOT_RSP, response)
             
         except Exception as e:
             logger.error(f"Error in snapshot handler: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, "Snapshot failed")
 
-    async def handle_bet_placement_request(self, websocket, payload: bytes):
+    async def handle_bet_placement_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle bet placement request"""
         try:
-            user = await self.game_state.get_user_by_connection(websocket)
-            if not user:
-                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
-                return
-            
             request = pb.BetPlacementRequest()
             request.ParseFromString(payload)
             
@@ -372,10 +423,9 @@ class GameServer:
                     response.round_id = request.round_id
                 else:
                     # Find the active round for this user
-                    for round_obj in self.game_state.active_rounds.values():
-                        if round_obj.user_id == user.user_id:
-                            response.round_id = round_obj.round_id
-                            break
+                    round_id = self.game_state.user_active_rounds.get(user.user_id)
+                    if round_id:
+                        response.round_id = round_id
             
             await self.send_response(websocket, S2C_BET_PLACEMENT_RSP, response)
             
@@ -385,14 +435,9 @@ class GameServer:
             logger.error(f"Error in bet placement handler: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, "Bet placement failed")
 
-    async def handle_bet_finished_request(self, websocket, payload: bytes):
+    async def handle_bet_finished_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle bet finished request"""
         try:
-            user = await self.game_state.get_user_by_connection(websocket)
-            if not user:
-                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
-                return
-            
             request = pb.BetFinishedRequest()
             request.ParseFromString(payload)
             
@@ -411,14 +456,9 @@ class GameServer:
             logger.error(f"Error in bet finished handler: {e}")
             await self.send_error(websocket, ERROR_SERVER_ERROR, "Bet finished failed")
 
-    async def handle_reckon_result_request(self, websocket, payload: bytes):
+    async def handle_reckon_result_request(self, websocket, payload: bytes, user: Optional[User]):
         """Handle result calculation request"""
         try:
-            user = await self.game_state.get_user_by_connection(websocket)
-            if not user:
-                await self.send_error(websocket, ERROR_AUTH_REQUIRED, "Authentication required")
-                return
-            
             request = pb.ReckonResultRequest()
             request.ParseFromString(payload)
             
@@ -455,20 +495,17 @@ class GameServer:
     async def send_response(self, websocket, command_id: int, message):
         """Send a Protocol Buffers response message"""
         try:
-            payload = message.SerializeToString()
-            header = struct.pack('<II', command_id, len(payload))
-            await websocket.send(header + payload)
+            await websocket.send(_encode_frame(command_id, message))
         except Exception as e:
             logger.error(f"Error sending response: {e}")
 
     async def send_error(self, websocket, error_code: int, error_message: str):
         """Send an error response"""
         try:
-            error = pb.ErrorResponse()
-            error.error_code = error_code
-            error.error_message = error_message
-            error.details = ""
-            await self.send_response(websocket, S2C_ERROR_RSP, error)
+            frame = _ERROR_FRAMES.get((error_code, error_message))
+            if frame is None:
+                frame = _encode_error_frame(error_code, error_message)
+            await websocket.send(frame)
         except Exception as e:
             logger.error(f"Error sending error response: {e}")
 
@@ -483,13 +520,13 @@ class GameServer:
                 await self.game_engine.cleanup_stale_rounds()
                 
                 # Clean up rate limits (remove old entries)
-                current_time = datetime.now()
-                expired_users = [
-                    user_id for user_id, (last_time, _) in self.rate_limits.items()
-                    if (current_time - last_time).total_seconds() > 3600  # 1 hour
+                now = time.monotonic()
+                expired_keys = [
+                    key for key, (_, last_time) in self.rate_limits.items()
+                    if now - last_time > 3600  # 1 hour
                 ]
-                for user_id in expired_users:
-                    del self.rate_limits[user_id]
+                for key in expired_keys:
+                    del self.rate_limits[key]
                 
                 await asyncio.sleep(300)  # Run every 5 minutes
                 
@@ -539,5 +576,20 @@ async def main():
             await server.shutdown()
 
 
+def run():
+    """Run the server, on the uvloop event loop when it is installed"""
+    if uvloop is None:
+        asyncio.run(main())
+        return
+    
+    logger.info("Using uvloop event loop")
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            runner.run(main())
+    else:
+        uvloop.install()
+        asyncio.run(main())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run()
\ No newline at end of file
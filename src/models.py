@@ -1,14 +1,28 @@
+from collections import OrderedDict, defaultdict
+from contextlib import AsyncExitStack
 from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 from enum import Enum
 import uuid
 import bcrypt
+import hashlib
+import os
 import asyncio
 import logging
+import sys
+import time
 
 logger = logging.getLogger(__name__)
 
+# Slotted dataclasses drop the per-instance __dict__ (Python 3.10+ only)
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Successful password checks are remembered briefly so reconnecting users skip bcrypt
+AUTH_CACHE_TTL_SECONDS = 300
+AUTH_CACHE_MAX_ENTRIES = 1024
+
 
 class GameRoundStatus(Enum):
     NO_ACTIVE_ROUND = 0
@@ -20,38 +34,46 @@ class GameRoundStatus(Enum):
 class User:
     user_id: int
     username: str
-    password_hash: str
+    password_hash: bytes
     balance: int
     session_token: Optional[str] = None
-    last_activity: datetime = field(default_factory=datetime.now)
+    last_activity: float = field(default_factory=lambda: User._now())  # session clock (monotonic), not wall time
     current_room: Optional[int] = None
     created_at: datetime = field(default_factory=datetime.now)
 
+    # Session clock (monotonic seconds); tests swap it for a fake to control expiry
+    _now = staticmethod(time.monotonic)
+    # bcrypt cost factor for new hashes; tests lower it, existing hashes keep their own cost
+    BCRYPT_ROUNDS = 12
+
+    @classmethod
+    def hash_password(cls, password: str) -> bytes:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cls.BCRYPT_ROUNDS))
+
     @classmethod
     def create_user(cls, user_id: int, username: str, password: str, balance: int = 1000):
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8')
         return cls(
             user_id=user_id,
             username=username,
-            password_hash=password_hash,
+            password_hash=cls.hash_password(password),
             balance=balance
         )
 
     def verify_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash)
 
     def generate_session_token(self) -> str:
         self.session_token = str(uuid.uuid4())
-        self.last_activity = datetime.now()
+        self.last_activity = self._now()
         return self.session_token
 
     def update_activity(self):
-        self.last_activity = datetime.now()
+        self.last_activity = self._now()
 
     def is_session_expired(self, timeout_seconds: int = 1800) -> bool:
         if not self.session_token:
             return True
-        return (datetime.now() - self.last_activity).total_seconds() > timeout_seconds
+        return self._now() - self.last_activity > timeout_seconds
 
 
 @dataclass
@@ -62,24 +84,24 @@ class Room:
     current_players: Set[int] = field(default_factory=set)
     jackpot_pool: int = 0
     created_at: datetime = field(default_factory=datetime.now)
-    last_activity: datetime = field(default_factory=datetime.now)
+    last_activity: float = field(default_factory=time.monotonic)  # monotonic clock, not wall time
 
     def add_player(self, user_id: int) -> bool:
         if len(self.current_players) >= self.max_capacity:
             return False
         self.current_players.add(user_id)
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()
         return True
 
     def remove_player(self, user_id: int):
         self.current_players.discard(user_id)
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()
 
     def get_player_count(self) -> int:
         return len(self.current_players)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class BetData:
     bet_id: str
     user_id: int
@@ -90,10 +112,13 @@ class BetData:
     payout: Optional[int] = None
     created_at: datetime = field(default_factory=datetime.now)
 
+    # Bet ID generator; tests swap in a counter for cheap, reproducible IDs
+    _id_factory = staticmethod(lambda: str(uuid.uuid4()))
+
     @classmethod
     def create_bet(cls, user_id: int, round_id: str, dice_face: int, amount: int):
         return cls(
-            bet_id=str(uuid.uuid4()),
+            bet_id=cls._id_factory(),
             user_id=user_id,
             round_id=round_id,
             dice_face=dice_face,
@@ -101,7 +126,7 @@ class BetData:
         )
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class GameRound:
     round_id: str
     user_id: int
@@ -113,10 +138,15 @@ class GameRound:
     created_at: datetime = field(default_factory=datetime.now)
     finished_at: Optional[datetime] = None
 
+    # Round ID generator; tests swap in a counter for cheap, reproducible IDs
+    _id_factory = staticmethod(lambda: str(uuid.uuid4()))
+    # A winning bet pays this many times its stake
+    PAYOUT_MULTIPLIER = 6
+
     @classmethod
     def create_round(cls, user_id: int, room_id: int):
         return cls(
-            round_id=str(uuid.uuid4()),
+            round_id=cls._id_factory(),
             user_id=user_id,
             room_id=room_id
         )
@@ -129,30 +159,65 @@ class GameRound:
 
     def calculate_results(self, dice_result: int) -> int:
         self.dice_result = dice_result
+        multiplier = self.PAYOUT_MULTIPLIER
         total_winnings = 0
         
         for bet in self.bets:
             won = (bet.dice_face == dice_result)
-            payout = bet.amount * 6 if won else 0
-            
             bet.won = won
-            bet.payout = payout
-            total_winnings += payout
+            bet.payout = bet.amount * multiplier if won else 0
+            total_winnings += bet.payout
         
         self.total_winnings = total_winnings
         self.finished_at = datetime.now()
         return total_winnings
 
 
+# Demo accounts created in every GameState: (username, password)
+DEFAULT_USERS = (
+    ("testuser1", "password123"),
+    ("testuser2", "password123"),
+    ("alice", "alicepass"),
+    ("bob", "bobpass"),
+    ("charlie", "charliepass"),
+)
+
+
+def _discard_idle_lock(locks: Dict[int, asyncio.Lock], key: int):
+    """Drop a lock from its registry unless it is held or has waiters, which must keep sharing it"""
+    lock = locks.get(key)
+    if lock is not None and not lock.locked() and not lock._waiters:
+        del locks[key]
+
+
+@lru_cache(maxsize=1)
+def _default_user_hashes() -> Tuple[Tuple[str, bytes], ...]:
+    """bcrypt hashes for the default users, computed once per process"""
+    return tuple((username, User.hash_password(password)) for username, password in DEFAULT_USERS)
+
+
 class GameState:
     def __init__(self):
+        self._auth_cache_key = os.urandom(32)
+        self.reset()
+
+    def reset(self):
+        """Drop all runtime state and recreate the default rooms and users"""
         self.users: Dict[int, User] = {}
+        self.users_by_name: Dict[str, User] = {}  # username -> User
+        self.users_by_session: Dict[str, User] = {}  # session_token -> User
         self.rooms: Dict[int, Room] = {}
         self.active_rounds: Dict[str, GameRound] = {}
-        self.connections: Dict[object, int] = {}  # WebSocket -> user_id
+        self.user_active_rounds: Dict[int, str] = {}  # user_id -> latest round_id; rolled-over rounds awaiting results are only in active_rounds
+        self.connections: Dict[object, int] = {}  # WebSocket -> user_id (the user itself rides on websocket.game_user)
         self.user_connections: Dict[int, object] = {}  # user_id -> WebSocket
         self.next_user_id = 1
-        self._lock = asyncio.Lock()
+        # Fine-grained locks, created on first use and dropped once their user disconnects or room empties;
+        # room locks are always taken in ascending room_id order
+        self._user_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._room_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Verified logins, least recently used first: keyed digest of (username, password) -> (password_hash, expires_at)
+        self._auth_cache: "OrderedDict[bytes, Tuple[bytes, float]]" = OrderedDict()
         
         # Initialize default rooms
         self._initialize_default_rooms()
@@ -168,137 +233,202 @@ class GameState:
             self.rooms[i] = room
 
     def _initialize_default_users(self):
-        # Create some default test users
-        test_users = [
-            ("testuser1", "password123"),
-            ("testuser2", "password123"),
-            ("alice", "alicepass"),
-            ("bob", "bobpass"),
-            ("charlie", "charliepass")
-        ]
-        
-        for username, password in test_users:
-            user = User.create_user(self.next_user_id, username, password, 1000000)
-            self.users[self.next_user_id] = user
+        # Create some default test users; their password hashes are shared across GameState instances
+        for username, password_hash in _default_user_hashes():
+            user = User(user_id=self.next_user_id, username=username, password_hash=password_hash, balance=1000000)
+            self.add_user(user)
             self.next_user_id += 1
 
+    def add_user(self, user: User):
+        """Register a user and index it by username"""
+        self.users[user.user_id] = user
+        self.users_by_name[user.username] = user
+
+    def _open_session(self, user: User) -> str:
+        """Issue a new session token for the user and index it"""
+        if user.session_token:
+            self.users_by_session.pop(user.session_token, None)
+        token = user.generate_session_token()
+        self.users_by_session[token] = user
+        return token
+
+    def invalidate_session(self, user: User):
+        """Clear the user's session token and drop it from the session index"""
+        if user.session_token:
+            self.users_by_session.pop(user.session_token, None)
+            user.session_token = None
+
     async def authenticate_user(self, username: str, password: str) -> Optional[User]:
-        async with self._lock:
-            for user in self.users.values():
-                if user.username == username and user.verify_password(password):
-                    # Check if user already has an active session
-                    if user.session_token and not user.is_session_expired():
-                        logger.warning(f"User {username} already has active session, login blocked")
-                        return None  # User already logged in
-                    
-                    user.generate_session_token()
-                    logger.info(f"User {username} authenticated successfully, session token generated")
-                    return user
+        user = self.users_by_name.get(username)
+        if not user or not await self._verify_password(user, password):
             logger.warning(f"Authentication failed for username: {username}")
             return None
+        
+        async with self._user_locks[user.user_id]:
+            # Check if user already has an active session
+            if user.session_token and not user.is_session_expired():
+                logger.warning(f"User {username} already has active session, login blocked")
+                return None  # User already logged in
+            
+            self._open_session(user)
+            logger.info(f"User {username} authenticated successfully, session token generated")
+            return user
+
+    async def _verify_password(self, user: User, password: str) -> bool:
+        """Check a password, consulting the short-lived cache of recent successful checks"""
+        key = hashlib.blake2b(f"{user.username}\0{password}".encode('utf-8'),
+                              key=self._auth_cache_key, digest_size=16).digest()
+        now = time.monotonic()
+        cached = self._auth_cache.get(key)
+        if cached:
+            # A changed password hash or an expired entry is a miss
+            if cached[0] == user.password_hash and cached[1] > now:
+                self._auth_cache.move_to_end(key)
+                return True
+            del self._auth_cache[key]
+        
+        # bcrypt is deliberately slow; verify in a worker thread so the event loop keeps serving others
+        if not await asyncio.get_running_loop().run_in_executor(None, user.verify_password, password):
+            return False
+        
+        if len(self._auth_cache) >= AUTH_CACHE_MAX_ENTRIES:
+            self._auth_cache.popitem(last=False)  # evict the least recently used entry
+        self._auth_cache[key] = (user.password_hash, now + AUTH_CACHE_TTL_SECONDS)
+        return True
 
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         return self.users.get(user_id)
 
     async def get_user_by_session(self, session_token: str) -> Optional[User]:
-        async with self._lock:
-            for user in self.users.values():
-                if user.session_token == session_token and not user.is_session_expired():
-                    user.update_activity()
-                    return user
-            return None
+        user = self.users_by_session.get(session_token)
+        if user and user.session_token == session_token and not user.is_session_expired():
+            user.update_activity()
+            return user
+        return None
 
     async def join_room(self, user_id: int, room_id: int) -> bool:
-        async with self._lock:
-            user = self.users.get(user_id)
-            room = self.rooms.get(room_id)
-            
-            if not user or not room:
-                return False
-            
-            # Leave current room if any
-            if user.current_room:
-                current_room = self.rooms.get(user.current_room)
-                if current_room:
-                    current_room.remove_player(user_id)
-            
-            # Join new room
-            if room.add_player(user_id):
-                user.current_room = room_id
-                return True
+        user = self.users.get(user_id)
+        room = self.rooms.get(room_id)
+        
+        if not user or not room:
             return False
+        
+        async with self._user_locks[user_id]:
+            previous_room_id = user.current_room
+            async with AsyncExitStack() as stack:
+                for locked_room_id in sorted({room_id, previous_room_id or room_id}):
+                    await stack.enter_async_context(self._room_locks[locked_room_id])
+                
+                # Leave current room if any
+                if previous_room_id:
+                    current_room = self.rooms.get(previous_room_id)
+                    if current_room:
+                        current_room.remove_player(user_id)
+                
+                # Join new room
+                joined = room.add_player(user_id)
+                if joined:
+                    user.current_room = room_id
+            
+            if previous_room_id and previous_room_id != room_id:
+                self._discard_room_lock_if_empty(previous_room_id)
+            return joined
 
     async def leave_room(self, user_id: int):
-        async with self._lock:
-            user = self.users.get(user_id)
-            if user and user.current_room:
-                room = self.rooms.get(user.current_room)
-                if room:
-                    room.remove_player(user_id)
-                user.current_room = None
+        user = self.users.get(user_id)
+        if not user:
+            return
+        
+        async with self._user_locks[user_id]:
+            room_id = user.current_room
+            if room_id:
+                async with self._room_locks[room_id]:
+                    room = self.rooms.get(room_id)
+                    if room:
+                        room.remove_player(user_id)
+                    user.current_room = None
+                self._discard_room_lock_if_empty(room_id)
+
+    def _discard_room_lock_if_empty(self, room_id: int):
+        """Drop the room's lock once nobody is seated there"""
+        room = self.rooms.get(room_id)
+        if not room or not room.current_players:
+            _discard_idle_lock(self._room_locks, room_id)
 
     async def get_room(self, room_id: int) -> Optional[Room]:
         return self.rooms.get(room_id)
 
     async def add_connection(self, websocket, user_id: int):
-        async with self._lock:
-            self.connections[websocket] = user_id
-            self.user_connections[user_id] = websocket
+        self.connections[websocket] = user_id
+        self.user_connections[user_id] = websocket
+        # Keep the user on the connection itself so per-message lookups skip the dicts
+        websocket.game_user = self.users.get(user_id)
 
     async def remove_connection(self, websocket):
-        async with self._lock:
-            user_id = self.connections.pop(websocket, None)
-            if user_id:
-                self.user_connections.pop(user_id, None)
-                # Leave room when disconnecting
-                await self.leave_room(user_id)
-                # Invalidate session
-                user = self.users.get(user_id)
-                if user:
-                    user.session_token = None
-                    logger.info(f"User {user_id} session invalidated due to disconnection")
-            else:
-                # Connection was not authenticated, just clean up
-                logger.debug("Removing unauthenticated connection")
-
-    async def get_user_by_connection(self, websocket) -> Optional[User]:
-        user_id = self.connections.get(websocket)
+        user_id = self.connections.pop(websocket, None)
+        websocket.game_user = None
         if user_id:
-            return self.users.get(user_id)
-        return None
+            self.user_connections.pop(user_id, None)
+            if await self.end_user_session(user_id):
+                logger.info(f"User {user_id} session invalidated due to disconnection")
+        else:
+            # Connection was not authenticated, just clean up
+            logger.debug("Removing unauthenticated connection")
+
+    async def end_user_session(self, user_id: int) -> bool:
+        """Leave the user's room, invalidate their session and drop their lock; False if the user is unknown"""
+        user = self.users.get(user_id)
+        if not user:
+            return False
+        
+        await self.leave_room(user_id)
+        async with self._user_locks[user_id]:
+            self.invalidate_session(user)
+        _discard_idle_lock(self._user_locks, user_id)
+        return True
+
+    def get_user_by_connection(self, websocket) -> Optional[User]:
+        return getattr(websocket, 'game_user', None)
 
     async def create_game_round(self, user_id: int) -> Optional[GameRound]:
-        async with self._lock:
-            user = self.users.get(user_id)
-            if not user or not user.current_room:
+        user = self.users.get(user_id)
+        if not user:
+            return None
+        
+        async with self._user_locks[user_id]:
+            if not user.current_room:
                 return None
             
             # Check for existing active round
-            for round_obj in self.active_rounds.values():
-                if (round_obj.user_id == user_id and 
-                    round_obj.status == GameRoundStatus.BETTING_PHASE):
-                    return round_obj
+            round_obj = self.active_rounds.get(self.user_active_rounds.get(user_id))
+            if round_obj and round_obj.status == GameRoundStatus.BETTING_PHASE:
+                return round_obj
             
             # Create new round
             game_round = GameRound.create_round(user_id, user.current_room)
             self.active_rounds[game_round.round_id] = game_round
+            self.user_active_rounds[user_id] = game_round.round_id
             return game_round
 
     async def get_game_round(self, round_id: str) -> Optional[GameRound]:
         return self.active_rounds.get(round_id)
 
     async def finish_game_round(self, round_id: str):
-        async with self._lock:
+        game_round = self.active_rounds.get(round_id)
+        if not game_round:
+            return
+        
+        async with self._user_locks[game_round.user_id]:
             self.active_rounds.pop(round_id, None)
+            if self.user_active_rounds.get(game_round.user_id) == round_id:
+                del self.user_active_rounds[game_round.user_id]
 
     async def cleanup_expired_sessions(self):
-        async with self._lock:
-            expired_users = []
-            for user in self.users.values():
-                if user.is_session_expired():
-                    expired_users.append(user)
-            
-            for user in expired_users:
-                user.session_token = None
-                if user.current_room:
-                    await self.leave_room(user.user_id)
\ No newline at end of file
+        expired_users = [user for user in self.users.values() if user.is_session_expired()]
+        
+        for user in expired_users:
+            async with self._user_locks[user.user_id]:
+                self.invalidate_session(user)
+            if user.current_room:
+                await self.leave_room(user.user_id)
+            _discard_idle_lock(self._user_locks, user.user_id)
\ No newline at end of file
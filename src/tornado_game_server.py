@@ -5,14 +5,17 @@ Game server using Tornado WebSocket instead of websockets library
 import tornado.web
 import tornado.websocket
 import tornado.ioloop
+import asyncio
 import struct
 import logging
 import signal
 import sys
 import time
 import argparse
-from datetime import datetime
-from typing import Dict, Optional
+import logging.handlers
+import queue
+import weakref
+from google.protobuf.internal import api_implementation
 from google.protobuf.message import DecodeError
 
 # Import generated protobuf messages
@@ -22,20 +25,52 @@ except ImportError:
     print("Error: Protocol buffer files not generated. Run: protoc --python_out=. --pyi_out=. proto/game_messages.proto")
     sys.exit(1)
 
-from .models import GameState, GameRoundStatus
+try:
+    import uvloop  # Optional faster event loop (installed with the "prod" extra)
+except ImportError:
+    uvloop = None
+
+from .models import GameState
 from .game_engine import GameEngine
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('tornado_game_server.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: records are queued on the event loop and written out by a background
+# thread, so file and console I/O never stall connections. Timestamps are the raw epoch
+# seconds (no strftime per record), and the full format is applied on the listener thread;
+# the QueueHandler only merges the message arguments.
+_log_formatter = logging.Formatter('%(created).3f %(name)s %(levelname)s %(message)s')
+_log_file_handler = logging.FileHandler('tornado_game_server.log')
+_log_file_handler.setFormatter(_log_formatter)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_file_handler, _log_stream_handler)
+_log_listener_running = False
+
 logger = logging.getLogger(__name__)
 
+
+def start_log_listener():
+    """Route root logging through the queue and start the background log writer (no-op if already running)"""
+    global _log_listener_running
+    if not _log_listener_running:
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(_log_queue_handler)
+        _log_listener.start()
+        _log_listener_running = True
+
+
+def stop_log_listener():
+    """Detach the queue handler, flush queued log records and stop the background log writer (no-op if not running)"""
+    global _log_listener_running
+    if _log_listener_running:
+        logging.getLogger().removeHandler(_log_queue_handler)
+        _log_listener.stop()
+        _log_listener_running = False
+
+
 # Command ID constants
 C2S_LOGIN_REQ = 0x0001
 S2C_LOGIN_RSP = 0x1001
@@ -51,6 +86,23 @@ C2S_RECKON_RESULT_REQ = 0x0006
 S2C_RECKON_RESULT_RSP = 0x1006
 S2C_ERROR_RSP = 0x9999
 
+# Packet header: command ID (uint32) + payload length (uint32), little-endian
+_HEADER = struct.Struct('<II')
+
+# Message classes bound once so the per-packet handlers skip the pb module attribute lookup
+_LoginRequest = pb.LoginRequest
+_RoomJoinRequest = pb.RoomJoinRequest
+_SnapshotRequest = pb.SnapshotRequest
+_BetPlacementRequest = pb.BetPlacementRequest
+_BetFinishedRequest = pb.BetFinishedRequest
+_ReckonResultRequest = pb.ReckonResultRequest
+_LoginResponse = pb.LoginResponse
+_RoomJoinResponse = pb.RoomJoinResponse
+_SnapshotResponse = pb.SnapshotResponse
+_BetPlacementResponse = pb.BetPlacementResponse
+_BetFinishedResponse = pb.BetFinishedResponse
+_ReckonResultResponse = pb.ReckonResultResponse
+
 # Error codes
 ERROR_INVALID_FORMAT = 1000
 ERROR_AUTH_REQUIRED = 1001
@@ -65,186 +117,220 @@ ERROR_RATE_LIMIT = 1009
 ERROR_INTERNAL = 1010
 
 
+def _encode_frame(command_id: int, message) -> bytes:
+    """Serialize a message into a complete header + payload frame"""
+    payload = message.SerializeToString()
+    # Tornado's write_message only takes bytes, so pack-and-concatenate beats a bytearray + copy
+    return _HEADER.pack(command_id, len(payload)) + payload
+
+
+def _encode_error_frame(error_code: int, error_message: str) -> bytes:
+    """Serialize an ErrorResponse into a complete header + payload frame"""
+    error_response = pb.ErrorResponse()
+    error_response.error_code = error_code
+    error_response.error_message = error_message
+    return _encode_frame(S2C_ERROR_RSP, error_response)
+
+
+# Fixed error replies, encoded once at import; other (code, message) pairs are encoded per call
+_ERROR_FRAMES = {
+    (code, message): _encode_error_frame(code, message)
+    for code, message in (
+        (ERROR_INVALID_FORMAT, "Invalid packet size"),
+        (ERROR_INVALID_FORMAT, "Packet length mismatch"),
+        (ERROR_INVALID_FORMAT, "Invalid protobuf message"),
+        (ERROR_AUTH_REQUIRED, "Authentication required"),
+        (ERROR_USER_NOT_FOUND, "User not found"),
+        (ERROR_RATE_LIMIT, "Rate limit exceeded"),
+        (ERROR_INTERNAL, "Internal server error"),
+        (ERROR_INTERNAL, "Login processing error"),
+        (ERROR_INTERNAL, "Room join processing error"),
+        (ERROR_INTERNAL, "Failed to get snapshot"),
+        (ERROR_INTERNAL, "Snapshot processing error"),
+        (ERROR_INTERNAL, "Bet placement processing error"),
+        (ERROR_INTERNAL, "Bet finished processing error"),
+        (ERROR_INTERNAL, "Reckon result processing error"),
+    )
+}
+
+
 class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
-    clients = {}  # Store client information
-    rate_limits = {}  # Rate limiting
+    clients = weakref.WeakSet()  # Open connections; per-client state lives on the handler itself
+    rate_limits = {}  # Rate limiting: user_id -> (tokens, last_refill_monotonic)
+    
+    # Token bucket settings; rate limiting is disabled for testing purposes
+    RATE_LIMIT_ENABLED = False
+    RATE_LIMIT_CAPACITY = 20.0
+    RATE_LIMIT_REFILL_PER_SEC = 20.0
+    RATE_LIMIT_CAPACITY_OVERRIDES = {1: 10**9}  # testuser1 is effectively unlimited for demos
+    
+    # Command ID -> handler method name
+    _HANDLERS = {
+        C2S_LOGIN_REQ: 'handle_login',
+        C2S_ROOM_JOIN_REQ: 'handle_room_join',
+        C2S_SNAPSHOT_REQ: 'handle_snapshot',
+        C2S_BET_PLACEMENT_REQ: 'handle_bet_placement',
+        C2S_BET_FINISHED_REQ: 'handle_bet_finished',
+        C2S_RECKON_RESULT_REQ: 'handle_reckon_result',
+    }
     
     def initialize(self, game_state, game_engine):
         self.game_state = game_state
         self.game_engine = game_engine
         self.user_id = 0
         self.authenticated = False
-        self.connect_time = datetime.now()
+        self.connect_time = time.time()
+        self._peer = self.request.remote_ip
+        self._loop = asyncio.get_running_loop()
+        self._tasks = set()  # Strong references to in-flight handler tasks
+        # Shared class-level registries, bound on the instance for cheaper access per message
+        self._clients = GameWebSocketHandler.clients
+        self._rate_limits = GameWebSocketHandler.rate_limits
+        self._dispatch = {command_id: getattr(self, name) for command_id, name in self._HANDLERS.items()}
 
     def open(self):
         """Called when WebSocket connection is opened"""
-        client_addr = self.request.remote_ip
-        logger.info(f"New client connected: {client_addr}")
+        # Send small protobuf frames immediately instead of waiting on Nagle
+        self.set_nodelay(True)
+        logger.info("New client connected: %s", self._peer)
         
-        # Store client info
-        GameWebSocketHandler.clients[id(self)] = {
-            'handler': self,
-            'address': client_addr,
-            'user_id': 0,
-            'authenticated': False,
-            'connect_time': datetime.now()
-        }
+        # Track open connection
+        self._clients.add(self)
 
     def on_message(self, message):
         """Called when a message is received"""
-        try:
-            if isinstance(message, bytes):
-                self.process_message(message)
-            else:
-                logger.warning(f"Received non-binary message from {self.request.remote_ip}")
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
+        # Unexpected errors propagate to Tornado, which logs them and closes the connection
+        if isinstance(message, bytes):
+            self.process_message(message)
+        else:
+            # The protocol is binary-only; drop clients that send text frames
+            logger.warning("Received non-binary message from %s", self._peer)
+            self.close(1003, "binary only")
 
     def on_close(self):
         """Called when WebSocket connection is closed"""
-        client_addr = self.request.remote_ip
-        logger.info(f"Client {client_addr} disconnected")
+        logger.info("Client %s disconnected", self._peer)
         
         # Clean up user session if authenticated
         if self.authenticated and self.user_id:
             try:
-                # Schedule async cleanup on the current event loop
-                import tornado.ioloop
-                tornado.ioloop.IOLoop.current().add_callback(self._cleanup_user_session)
+                # Schedule async cleanup on the event loop
+                self._spawn(self._cleanup_user_session())
             except Exception as e:
-                logger.error(f"Error during disconnect cleanup: {e}")
+                logger.error("Error during disconnect cleanup: %s", e)
         
-        # Clean up client info
-        if id(self) in GameWebSocketHandler.clients:
-            del GameWebSocketHandler.clients[id(self)]
+        # Stop tracking connection
+        self._clients.discard(self)
     
     async def _cleanup_user_session(self):
         """Async helper for cleaning up user session on disconnect"""
         try:
-            # Leave room
-            await self.game_state.leave_room(self.user_id)
-            # Invalidate session
-            user = self.game_state.users.get(self.user_id)
-            if user:
-                user.session_token = None
-                logger.info(f"User {self.user_id} session invalidated due to disconnection")
+            # Leave room and invalidate session
+            if await self.game_state.end_user_session(self.user_id):
+                logger.info("User %s session invalidated due to disconnection", self.user_id)
         except Exception as e:
-            logger.error(f"Error in async cleanup: {e}")
+            logger.error("Error in async cleanup: %s", e)
 
     def process_message(self, raw_data: bytes):
         """Process a received message"""
-        try:
-            # Parse packet header
-            if len(raw_data) < 8:
-                self.send_error(ERROR_INVALID_FORMAT, "Invalid packet size")
-                return
-            
-            command_id, length = struct.unpack('<II', raw_data[:8])
-            
-            if len(raw_data) != 8 + length:
-                self.send_error(ERROR_INVALID_FORMAT, "Packet length mismatch")
+        # Parse packet header
+        size = len(raw_data)
+        if size < _HEADER.size:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid packet size")
+            return
+        
+        data = memoryview(raw_data)
+        command_id, length = _HEADER.unpack_from(data)
+        
+        # WebSocket already frames the message, so only a truncated payload is an error;
+        # trailing bytes past the declared length are ignored
+        end = _HEADER.size + length
+        if size < end:
+            self.send_error(ERROR_INVALID_FORMAT, "Packet length mismatch")
+            return
+        
+        # Zero-copy view of the payload; protobuf parses straight from the buffer
+        payload = data[_HEADER.size:end]
+        
+        # Check rate limiting for authenticated users
+        if self.authenticated:
+            if not self.check_rate_limit(self.user_id):
+                self.send_error(ERROR_RATE_LIMIT, "Rate limit exceeded")
                 return
-            
-            payload = raw_data[8:]
-            
-            # Check rate limiting for authenticated users
-            if self.authenticated:
-                if not self.check_rate_limit(self.user_id):
-                    self.send_error(ERROR_RATE_LIMIT, "Rate limit exceeded")
-                    return
-            
-            # Route message based on command ID - run async handlers
-            import tornado.ioloop
-            io_loop = tornado.ioloop.IOLoop.current()
-            
-            if command_id == C2S_LOGIN_REQ:
-                io_loop.add_callback(self.handle_login, payload)
-            elif command_id == C2S_ROOM_JOIN_REQ:
-                io_loop.add_callback(self.handle_room_join, payload)
-            elif command_id == C2S_SNAPSHOT_REQ:
-                io_loop.add_callback(self.handle_snapshot, payload)
-            elif command_id == C2S_BET_PLACEMENT_REQ:
-                io_loop.add_callback(self.handle_bet_placement, payload)
-            elif command_id == C2S_BET_FINISHED_REQ:
-                io_loop.add_callback(self.handle_bet_finished, payload)
-            elif command_id == C2S_RECKON_RESULT_REQ:
-                io_loop.add_callback(self.handle_reckon_result, payload)
-            else:
-                logger.warning(f"Unknown command ID: 0x{command_id:04X}")
-                self.send_error(ERROR_INVALID_FORMAT, f"Unknown command: 0x{command_id:04X}")
-                
-        except struct.error:
-            self.send_error(ERROR_INVALID_FORMAT, "Invalid packet format")
-        except DecodeError:
-            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            self.send_error(ERROR_INTERNAL, "Internal server error")
+        
+        # Route message based on command ID - run async handlers
+        handler = self._dispatch.get(command_id)
+        if handler:
+            self._spawn(handler(payload))
+        else:
+            logger.warning("Unknown command ID: 0x%04X", command_id)
+            self.send_error(ERROR_INVALID_FORMAT, f"Unknown command: 0x{command_id:04X}")
+
+    def _spawn(self, coro):
+        """Run a coroutine as a task on the handler's loop, holding a reference until it finishes"""
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
     def check_rate_limit(self, user_id: int) -> bool:
-        """Check if user is within rate limits"""
-        # Rate limiting disabled for testing purposes
-        return True
+        """Check if user is within rate limits (token bucket on the monotonic clock)"""
+        if not self.RATE_LIMIT_ENABLED:
+            return True
+        
+        now = time.monotonic()
+        capacity = self.RATE_LIMIT_CAPACITY_OVERRIDES.get(user_id, self.RATE_LIMIT_CAPACITY)
+        tokens, last = self._rate_limits.get(user_id, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * self.RATE_LIMIT_REFILL_PER_SEC)
+        
+        if tokens < 1.0:
+            self._rate_limits[user_id] = (tokens, now)
+            return False
         
-        # Original rate limiting logic (commented out for testing):
-        # # For demo purposes, allow more requests for user 1 (testuser1)
-        # if user_id == 1:
-        #     return True
-        #     
-        # now = time.time()
-        # last_request = GameWebSocketHandler.rate_limits.get(user_id, 0)
-        # 
-        # if now - last_request < 0.05:  # Max 20 requests per second
-        #     return False
-        # 
-        # GameWebSocketHandler.rate_limits[user_id] = now
-        # return True
+        self._rate_limits[user_id] = (tokens - 1.0, now)
+        return True
 
     async def handle_login(self, payload: bytes):
         """Handle login request"""
         try:
-            request = pb.LoginRequest()
+            request = _LoginRequest()
             request.ParseFromString(payload)
             
-            logger.info(f"Login attempt: {request.username}")
+            logger.info("Login attempt: %s", request.username)
             
             # Use actual authentication from game state
             user = await self.game_state.authenticate_user(request.username, request.password)
             
-            response = pb.LoginResponse()
+            response = _LoginResponse()
             if user:
                 # Successful login
                 self.authenticated = True
                 self.user_id = user.user_id
                 
-                # Update client info
-                if id(self) in GameWebSocketHandler.clients:
-                    GameWebSocketHandler.clients[id(self)]['authenticated'] = True
-                    GameWebSocketHandler.clients[id(self)]['user_id'] = user.user_id
-                
                 response.success = True
                 response.message = "Login successful"
                 response.session_token = user.session_token
                 response.user_id = user.user_id
                 response.balance = user.balance
                 
-                logger.info(f"User {request.username} logged in successfully")
+                logger.info("User %s logged in successfully", request.username)
             else:
                 # Failed login
                 response.success = False
                 response.message = "Invalid credentials or user already logged in"
-                logger.warning(f"Login failed for user: {request.username}")
+                logger.warning("Login failed for user: %s", request.username)
             
             self.send_message(S2C_LOGIN_RSP, response)
                 
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Login error: {e}")
+            logger.error("Login error: %s", e)
             self.send_error(ERROR_INTERNAL, "Login processing error")
 
     async def handle_room_join(self, payload: bytes):
         """Handle room join request"""
         try:
-            request = pb.RoomJoinRequest()
+            request = _RoomJoinRequest()
             request.ParseFromString(payload)
             
             if not self.authenticated:
@@ -254,7 +340,7 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
             # Use actual room join from game state
             success = await self.game_state.join_room(self.user_id, request.room_id)
             
-            response = pb.RoomJoinResponse()
+            response = _RoomJoinResponse()
             if success:
                 room = await self.game_state.get_room(request.room_id)
                 response.success = True
@@ -263,21 +349,23 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
                 response.player_count = room.get_player_count() if room else 0
                 response.jackpot_pool = room.jackpot_pool if room else 0
                 
-                logger.info(f"User {self.user_id} joined room {request.room_id}")
+                logger.info("User %s joined room %s", self.user_id, request.room_id)
             else:
                 response.success = False
                 response.message = "Failed to join room (room full or invalid)"
             
             self.send_message(S2C_ROOM_JOIN_RSP, response)
                 
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Room join error: {e}")
+            logger.error("Room join error: %s", e)
             self.send_error(ERROR_INTERNAL, "Room join processing error")
 
     async def handle_snapshot(self, payload: bytes):
         """Handle snapshot request"""
         try:
-            request = pb.SnapshotRequest()
+            request = _SnapshotRequest()
             request.ParseFromString(payload)
             
             if not self.authenticated:
@@ -285,35 +373,24 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
                 return
             
             # Use actual snapshot from game engine
-            snapshot = await self.game_engine.get_user_snapshot(self.user_id)
+            response = await self.game_engine.fill_snapshot(_SnapshotResponse(), self.user_id)
             
-            if not snapshot:
+            if response is None:
                 self.send_error(ERROR_INTERNAL, "Failed to get snapshot")
                 return
             
-            response = pb.SnapshotResponse()
-            response.user_balance = snapshot['user_balance']
-            response.current_room = snapshot['current_room']
-            response.jackpot_pool = snapshot['jackpot_pool']
-            response.round_status = snapshot['round_status']
-            
-            for bet_data in snapshot['active_bets']:
-                bet = response.active_bets.add()
-                bet.dice_face = bet_data['dice_face']
-                bet.amount = bet_data['amount']
-                bet.bet_id = bet_data['bet_id']
-                bet.round_id = bet_data['round_id']
-            
             self.send_message(S2C_SNAPSHOT_RSP, response)
             
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Snapshot error: {e}")
+            logger.error("Snapshot error: %s", e)
             self.send_error(ERROR_INTERNAL, "Snapshot processing error")
 
     async def handle_bet_placement(self, payload: bytes):
         """Handle bet placement request"""
         try:
-            request = pb.BetPlacementRequest()
+            request = _BetPlacementRequest()
             request.ParseFromString(payload)
             
             if not self.authenticated:
@@ -331,29 +408,30 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
                 self.user_id, request.dice_face, request.amount, request.round_id or None
             )
             
-            response = pb.BetPlacementResponse()
+            response = _BetPlacementResponse()
             response.success = success
             response.message = message
             response.remaining_balance = user.balance
             
             if success and bet_id:
                 response.bet_id = bet_id
-                # Get the round ID from active rounds
-                for round_obj in self.game_state.active_rounds.values():
-                    if round_obj.user_id == self.user_id:
-                        response.round_id = round_obj.round_id
-                        break
+                # Get the round ID from the user's active round
+                round_id = self.game_state.user_active_rounds.get(self.user_id)
+                if round_id:
+                    response.round_id = round_id
             
             self.send_message(S2C_BET_PLACEMENT_RSP, response)
             
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Bet placement error: {e}")
+            logger.error("Bet placement error: %s", e)
             self.send_error(ERROR_INTERNAL, "Bet placement processing error")
 
     async def handle_bet_finished(self, payload: bytes):
         """Handle bet finished request"""
         try:
-            request = pb.BetFinishedRequest()
+            request = _BetFinishedRequest()
             request.ParseFromString(payload)
             
             if not self.authenticated:
@@ -363,21 +441,23 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
             # Use the actual game engine for finishing betting
             success, message = await self.game_engine.finish_betting(self.user_id, request.round_id)
             
-            response = pb.BetFinishedResponse()
+            response = _BetFinishedResponse()
             response.success = success
             response.message = message
             response.round_id = request.round_id
             
             self.send_message(S2C_BET_FINISHED_RSP, response)
             
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Bet finished error: {e}")
+            logger.error("Bet finished error: %s", e)
             self.send_error(ERROR_INTERNAL, "Bet finished processing error")
 
     async def handle_reckon_result(self, payload: bytes):
         """Handle reckon result request"""
         try:
-            request = pb.ReckonResultRequest()
+            request = _ReckonResultRequest()
             request.ParseFromString(payload)
             
             if not self.authenticated:
@@ -391,7 +471,7 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
                 self.send_error(ERROR_ROUND_NOT_FOUND, message)
                 return
             
-            response = pb.ReckonResultResponse()
+            response = _ReckonResultResponse()
             response.dice_result = results['dice_result']
             response.total_winnings = results['total_winnings']
             response.new_balance = results['new_balance']
@@ -409,34 +489,32 @@ class GameWebSocketHandler(tornado.websocket.WebSocketHandler):
             
             self.send_message(S2C_RECKON_RESULT_RSP, response)
             
+        except DecodeError:
+            self.send_error(ERROR_INVALID_FORMAT, "Invalid protobuf message")
         except Exception as e:
-            logger.error(f"Reckon result error: {e}")
+            logger.error("Reckon result error: %s", e)
             self.send_error(ERROR_INTERNAL, "Reckon result processing error")
 
     def send_message(self, command_id: int, message):
         """Send a Protocol Buffers message to client"""
         try:
-            payload = message.SerializeToString()
-            header = struct.pack('<II', command_id, len(payload))
-            data = header + payload
-            
             # Send as binary data
-            self.write_message(data, binary=True)
+            self.write_message(_encode_frame(command_id, message), binary=True)
             
         except Exception as e:
-            logger.error(f"Error sending message: {e}")
+            logger.error("Error sending message: %s", e)
 
     def send_error(self, error_code: int, error_message: str):
         """Send an error response to client"""
         try:
-            error_response = pb.ErrorResponse()
-            error_response.error_code = error_code
-            error_response.error_message = error_message
+            frame = _ERROR_FRAMES.get((error_code, error_message))
+            if frame is None:
+                frame = _encode_error_frame(error_code, error_message)
             
-            self.send_message(S2C_ERROR_RSP, error_response)
+            self.write_message(frame, binary=True)
             
         except Exception as e:
-            logger.error(f"Error sending error response: {e}")
+            logger.error("Error sending error response: %s", e)
 
 
 class TornadoGameServer:
@@ -457,12 +535,19 @@ class TornadoGameServer:
         self.game_state = GameState()
         self.game_engine = GameEngine(self.game_state)
         
-        logger.info(f"Starting Tornado game server on {self.host}:{self.port}")
+        logger.info("Starting Tornado game server on %s:%s", self.host, self.port)
+        
+        protobuf_backend = api_implementation.Type()
+        if protobuf_backend == 'python':
+            logger.warning("protobuf is running the pure-Python backend; install a protobuf wheel "
+                           "with the upb/C++ extension for faster message handling")
+        else:
+            logger.info("protobuf backend: %s", protobuf_backend)
         
         # Create Tornado application
         self.app = tornado.web.Application([
             (r"/", GameWebSocketHandler, dict(game_state=self.game_state, game_engine=self.game_engine)),
-        ])
+        ], websocket_max_message_size=64*1024)  # 64KB max message size; requests are tiny
         
         # Start server
         self.app.listen(self.port, address=self.host)
@@ -472,7 +557,9 @@ class TornadoGameServer:
         tornado.ioloop.IOLoop.current().start()
 
     def shutdown(self):
-        """Shutdown the server"""
+        """Shutdown the server (no-op if it is not running)"""
+        if not self.running:
+            return
         logger.info("Shutting down Tornado game server...")
         self.running = False
         
@@ -485,7 +572,7 @@ class TornadoGameServer:
 def setup_signal_handlers(server):
     """Setup signal handlers for graceful shutdown"""
     def signal_handler(signum, frame):
-        logger.info(f"Received signal {signum}")
+        logger.info("Received signal %s", signum)
         server.shutdown()
     
     signal.signal(signal.SIGINT, signal_handler)
@@ -502,6 +589,13 @@ def main():
     
     args = parser.parse_args()
     
+    start_log_listener()
+    
+    # Tornado runs on asyncio, so installing a uvloop loop before the IOLoop is created is enough
+    if uvloop is not None:
+        asyncio.set_event_loop(uvloop.new_event_loop())
+        logger.info("Using uvloop event loop")
+    
     server = TornadoGameServer(args.host, args.port, args.max_connections)
     setup_signal_handlers(server)
     
@@ -510,9 +604,10 @@ def main():
     except KeyboardInterrupt:
         logger.info("Server interrupted by user")
     except Exception as e:
-        logger.error(f"Server error: {e}")
+        logger.error("Server error: %s", e)
     finally:
         server.shutdown()
+        stop_log_listener()
 
 
 if __name__ == "__main__":
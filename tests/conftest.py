@@ -0,0 +1,91 @@
+import asyncio
+import functools
+import itertools
+
+import pytest
+import pytest_asyncio
+
+try:
+    import uvloop  # Optional faster event loop, same extra the servers use
+except ImportError:
+    uvloop = None
+
+# Import our modules
+from src.models import User, BetData, GameRound
+
+
+if uvloop is not None:
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_asyncio_loop_factories(config, item):
+        """Run async tests and fixtures on uvloop when it is installed"""
+        return {"uvloop": uvloop.new_event_loop}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def sequential_ids():
+    """Replace UUID4 bet/round IDs with counters: no urandom per object and reproducible values"""
+    with pytest.MonkeyPatch.context() as mp:
+        bet_ids = itertools.count(1)
+        round_ids = itertools.count(1)
+        mp.setattr(BetData, "_id_factory", staticmethod(lambda: f"bet-{next(bet_ids)}"))
+        mp.setattr(GameRound, "_id_factory", staticmethod(lambda: f"round-{next(round_ids)}"))
+        yield
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_bcrypt():
+    """Hash with bcrypt's minimum cost: tests check behaviour, not KDF strength"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(User, "BCRYPT_ROUNDS", 4)
+        yield
+
+
+@pytest.fixture(scope="session")
+def hashed_password(fast_bcrypt):
+    """bcrypt hash of "password123", computed once per session"""
+    return User.hash_password("password123")
+
+
+@pytest.fixture(scope="session")
+def make_user(hashed_password):
+    """Factory for users with password "password123" that reuses the cached hash"""
+    def _make_user(user_id: int, username: str, balance: int = 1000) -> User:
+        return User(user_id=user_id, username=username, password_hash=hashed_password, balance=balance)
+    return _make_user
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def game_server(unused_tcp_port_factory):
+    """Start one GameServer per test session (per xdist worker) and yield its port"""
+    # Imported here so unit-test-only runs never load the server and websockets stack
+    from src.game_server import GameServer
+    
+    import websockets
+    
+    port = unused_tcp_port_factory()
+    server = GameServer('localhost', port, 10)
+    # Short close handshake so teardown never waits out the 10s default on a stuck client
+    serve = functools.partial(websockets.serve, close_timeout=0.1)
+    server_task = asyncio.create_task(server.start_server(serve_factory=serve))
+    await asyncio.wait_for(server.ready.wait(), timeout=5)
+
+    yield port
+
+    await server.shutdown()
+    await server_task
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def inproc_server():
+    """Start one GameServer on the in-memory transport and yield it; no sockets are opened"""
+    from src.game_server import GameServer
+    from tests.inproc_transport import inproc_serve
+    
+    server = GameServer('localhost', 0, 10)
+    server_task = asyncio.create_task(server.start_server(serve_factory=inproc_serve))
+    await asyncio.wait_for(server.ready.wait(), timeout=5)
+
+    yield server
+
+    await server.shutdown()
+    await server_task
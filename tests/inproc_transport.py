@@ -0,0 +1,72 @@
+"""In-memory stand-in for the websockets transport, wiring GameClient to GameServer through queues"""
+import asyncio
+
+from websockets.exceptions import ConnectionClosedOK
+
+_CLOSED = None  # Queue sentinel marking the end of the stream
+
+
+class InProcWebSocket:
+    """One end of an in-memory connection, duck-typing the websockets calls the game code makes"""
+
+    remote_address = ('inproc', 0)
+
+    def __init__(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        self._inbox = inbox
+        self._outbox = outbox
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            raise ConnectionClosedOK(None, None)
+        self._outbox.put_nowait(bytes(message))
+
+    async def recv(self):
+        message = await self._inbox.get()
+        if message is _CLOSED:
+            self.closed = True
+            raise ConnectionClosedOK(None, None)
+        return message
+
+    async def close(self):
+        self.shutdown()
+
+    def shutdown(self):
+        """Close both directions so pending recv() calls on either end return"""
+        if not self.closed:
+            self.closed = True
+            self._outbox.put_nowait(_CLOSED)
+            self._inbox.put_nowait(_CLOSED)
+
+
+class InProcServer:
+    """Stand-in for the object websockets.serve() returns; hands new connections to the handler"""
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._connections = []
+        self._tasks = set()
+
+    def connect(self) -> InProcWebSocket:
+        """Open a connection and return the client end"""
+        to_server, to_client = asyncio.Queue(), asyncio.Queue()
+        client = InProcWebSocket(to_client, to_server)
+        server = InProcWebSocket(to_server, to_client)
+        self._connections.append(server)
+        task = asyncio.create_task(self._handler(server))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return client
+
+    def close(self):
+        for connection in self._connections:
+            connection.shutdown()
+
+    async def wait_closed(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def inproc_serve(handler, host, port, **kwargs):
+    """serve_factory for GameServer.start_server that never opens a socket"""
+    return InProcServer(handler)
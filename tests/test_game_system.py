@@ -1,664 +1,612 @@
-import unittest
 import asyncio
-import threading
-import time
-import websockets
-from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime, timedelta
+import copy
+import struct
+import pytest
+import pytest_asyncio
 
 # Import our modules
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-
 from src.models import User, Room, GameRound, BetData, GameState, GameRoundStatus
 from src.game_engine import GameEngine
-from src.game_server import GameServer
-from src.tornado_game_server import TornadoGameServer, GameWebSocketHandler
-from src.game_client import GameClient
+from src.tornado_game_server import TornadoGameServer
 from proto import game_messages_pb2 as pb
 
 
-class TestUser(unittest.TestCase):
-    """Test User model functionality"""
-    
-    def test_create_user(self):
-        """Test user creation with password hashing"""
-        user = User.create_user(1, "testuser", "password123", 1000)
-        
-        self.assertEqual(user.user_id, 1)
-        self.assertEqual(user.username, "testuser")
-        self.assertEqual(user.balance, 1000)
-        self.assertIsNotNone(user.password_hash)
-        self.assertTrue(user.verify_password("password123"))
-        self.assertFalse(user.verify_password("wrongpassword"))
-    
-    def test_session_token_generation(self):
-        """Test session token generation and validation"""
-        user = User.create_user(1, "testuser", "password123")
-        
-        token = user.generate_session_token()
-        self.assertIsNotNone(token)
-        self.assertEqual(user.session_token, token)
-        self.assertFalse(user.is_session_expired())
-        
-        # Test expired session
-        user.last_activity = datetime.now() - timedelta(seconds=1801)
-        self.assertTrue(user.is_session_expired())
+# Fixtures
+@pytest.fixture(scope="module")
+def shared_game_state():
+    """Build one game state per module; tests get it reset through game_state"""
+    return GameState()
 
 
-class TestRoom(unittest.TestCase):
-    """Test Room model functionality"""
-    
-    def test_room_creation(self):
-        """Test room creation and basic operations"""
-        room = Room(1, "Test Room", 5)
-        
-        self.assertEqual(room.room_id, 1)
-        self.assertEqual(room.name, "Test Room")
-        self.assertEqual(room.max_capacity, 5)
-        self.assertEqual(room.get_player_count(), 0)
-    
-    def test_player_management(self):
-        """Test adding and removing players"""
-        room = Room(1, "Test Room", 2)
-        
-        # Add players
-        self.assertTrue(room.add_player(1))
-        self.assertTrue(room.add_player(2))
-        self.assertEqual(room.get_player_count(), 2)
-        
-        # Try to add player when room is full
-        self.assertFalse(room.add_player(3))
-        
-        # Remove player
-        room.remove_player(1)
-        self.assertEqual(room.get_player_count(), 1)
-        self.assertNotIn(1, room.current_players)
+@pytest.fixture
+def game_state(shared_game_state):
+    """Reset the shared game state to the default users and rooms"""
+    shared_game_state.reset()
+    return shared_game_state
 
 
-class TestGameRound(unittest.TestCase):
-    """Test GameRound model functionality"""
-    
-    def test_round_creation(self):
-        """Test game round creation"""
-        round_obj = GameRound.create_round(1, 1)
-        
-        self.assertEqual(round_obj.user_id, 1)
-        self.assertEqual(round_obj.room_id, 1)
-        self.assertEqual(round_obj.status, GameRoundStatus.BETTING_PHASE)
-        self.assertEqual(len(round_obj.bets), 0)
-    
-    def test_bet_management(self):
-        """Test adding bets to a round"""
-        round_obj = GameRound.create_round(1, 1)
-        bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
-        
-        round_obj.add_bet(bet)
-        self.assertEqual(len(round_obj.bets), 1)
-        self.assertEqual(round_obj.bets[0].dice_face, 3)
-        self.assertEqual(round_obj.bets[0].amount, 100)
-    
-    def test_result_calculation(self):
-        """Test calculating round results"""
-        round_obj = GameRound.create_round(1, 1)
-        
-        # Add some bets
-        bet1 = BetData.create_bet(1, round_obj.round_id, 3, 100)  # Will win
-        bet2 = BetData.create_bet(1, round_obj.round_id, 6, 50)   # Will lose
-        round_obj.add_bet(bet1)
-        round_obj.add_bet(bet2)
-        
-        # Calculate results with dice showing 3
-        total_winnings = round_obj.calculate_results(3)
-        
-        self.assertEqual(round_obj.dice_result, 3)
-        self.assertEqual(total_winnings, 600)  # 100 * 6
-        self.assertTrue(bet1.won)
-        self.assertFalse(bet2.won)
-        self.assertEqual(bet1.payout, 600)
-        self.assertEqual(bet2.payout, 0)
+@pytest.fixture
+def game_engine(game_state):
+    """Create a game engine over the fixture game state"""
+    return GameEngine(game_state)
+
+
+@pytest.fixture
+def user(game_state, make_user):
+    """Create test user 1, already seated in room 1"""
+    user = make_user(1, "testuser", 1000)
+    game_state.users[1] = user
+    user.current_room = 1
+    return user
+
+
+# Test User model functionality
+def test_create_user():
+    """Test user creation with password hashing"""
+    user = User.create_user(1, "testuser", "password123", 1000)
+    
+    assert user.user_id == 1
+    assert user.username == "testuser"
+    assert user.balance == 1000
+    assert user.password_hash is not None
+    assert user.verify_password("password123")
+    assert not user.verify_password("wrongpassword")
+
+
+def test_session_token_generation(make_user, monkeypatch):
+    """Test session token generation and validation"""
+    clock = [1000.0]
+    monkeypatch.setattr(User, "_now", staticmethod(lambda: clock[0]))
+    user = make_user(1, "testuser")
+    assert user.last_activity == 1000.0  # New users start on the session clock
+    
+    token = user.generate_session_token()
+    assert token is not None
+    assert user.session_token == token
+    assert not user.is_session_expired()
+    
+    # Test expired session
+    clock[0] += 1801
+    assert user.is_session_expired()
+
+
+# Test Room model functionality
+def test_room_creation():
+    """Test room creation and basic operations"""
+    room = Room(1, "Test Room", 5)
+    
+    assert room.room_id == 1
+    assert room.name == "Test Room"
+    assert room.max_capacity == 5
+    assert room.get_player_count() == 0
+
+
+def test_player_management():
+    """Test adding and removing players"""
+    room = Room(1, "Test Room", 2)
+    
+    # Add players
+    assert room.add_player(1)
+    assert room.add_player(2)
+    assert room.get_player_count() == 2
+    
+    # Try to add player when room is full
+    assert not room.add_player(3)
+    
+    # Remove player
+    room.remove_player(1)
+    assert room.get_player_count() == 1
+    assert 1 not in room.current_players
+
+
+# Test GameRound model functionality
+def test_round_creation():
+    """Test game round creation"""
+    round_obj = GameRound.create_round(1, 1)
+    
+    assert round_obj.user_id == 1
+    assert round_obj.room_id == 1
+    assert round_obj.status == GameRoundStatus.BETTING_PHASE
+    assert len(round_obj.bets) == 0
+
+
+def test_bet_management():
+    """Test adding bets to a round"""
+    round_obj = GameRound.create_round(1, 1)
+    bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
+    
+    round_obj.add_bet(bet)
+    assert len(round_obj.bets) == 1
+    assert round_obj.bets[0].dice_face == 3
+    assert round_obj.bets[0].amount == 100
 
 
-class TestGameEngine(unittest.TestCase):
-    """Test GameEngine functionality"""
+def test_result_calculation():
+    """Test calculating round results"""
+    round_obj = GameRound.create_round(1, 1)
+    
+    # Add some bets
+    bet1 = BetData.create_bet(1, round_obj.round_id, 3, 100)  # Will win
+    bet2 = BetData.create_bet(1, round_obj.round_id, 6, 50)   # Will lose
+    round_obj.add_bet(bet1)
+    round_obj.add_bet(bet2)
+    
+    # Calculate results with dice showing 3
+    total_winnings = round_obj.calculate_results(3)
+    
+    assert round_obj.dice_result == 3
+    assert total_winnings == 600  # 100 * 6
+    assert bet1.won
+    assert not bet2.won
+    assert bet1.payout == 600
+    assert bet2.payout == 0
+
+
+# One pre-built bet per dice face; tests copy these instead of minting a UUID per case
+_BET_TEMPLATES = {face: BetData.create_bet(1, "template-round", face, 100) for face in range(1, 7)}
+
+
+@pytest.mark.parametrize("bet_face,dice,expected_winnings", [
+    (f, d, 600 if f == d else 0) for f in range(1, 7) for d in range(1, 7)
+])
+def test_payout(bet_face, dice, expected_winnings):
+    """Test the payout for every bet face / dice result combination"""
+    round_obj = GameRound.create_round(1, 1)
+    bet = copy.copy(_BET_TEMPLATES[bet_face])
+    round_obj.add_bet(bet)
+    
+    assert round_obj.calculate_results(dice) == expected_winnings
+    assert bet.won == (bet_face == dice)
+    assert bet.payout == expected_winnings
+
+
+# Test GameEngine functionality
+@pytest.mark.asyncio
+async def test_place_bet_success(game_engine, user):
+    """Test successful bet placement"""
+    success, message, bet_id = await game_engine.place_bet(1, 3, 100)
+    
+    assert success
+    assert message == "Bet placed successfully"
+    assert bet_id is not None
+    assert user.balance == 900  # 1000 - 100
+
+
+@pytest.fixture(scope="module")
+def shared_engine_with_user(make_user):
+    """Engine with a registered test user seated in room 1, built once per module"""
+    state = GameState()
+    user = make_user(state.next_user_id, "testuser", 1000)
+    state.add_user(user)
+    state.next_user_id += 1
+    state.rooms[1].add_player(user.user_id)
+    user.current_room = 1
+    return GameEngine(state), user
+
+
+@pytest.fixture
+def engine_with_user(shared_engine_with_user):
+    """Shared engine and user, reset so no case sees rounds or balance left by an earlier one"""
+    game_engine, user = shared_engine_with_user
+    game_engine.game_state.active_rounds.clear()
+    game_engine.game_state.user_active_rounds.clear()
+    user.balance = 1000
+    return game_engine, user
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dice,amount,balance,msg", [
+    pytest.param(7, 100, 1000, "Invalid dice face (must be 1-6)", id="dice-too-high"),
+    pytest.param(0, 50, 100, "Invalid dice face (must be 1-6)", id="dice-too-low"),
+    pytest.param(3, 2000, 1000, "Invalid bet amount (1-1000)", id="amount-too-high"),
+    pytest.param(3, 0, 1000, "Invalid bet amount (1-1000)", id="amount-zero"),
+    pytest.param(3, 1001, 100, "Invalid bet amount (1-1000)", id="amount-over-limit"),
+    pytest.param(3, 100, 50, "Insufficient balance", id="balance-short"),
+    pytest.param(3, 150, 100, "Insufficient balance", id="balance-short-low"),
+])
+async def test_place_bet_rejects(engine_with_user, dice, amount, balance, msg):
+    """Test bet placement validation errors"""
+    game_engine, user = engine_with_user
+    user.balance = balance
+    success, message, bet_id = await game_engine.place_bet(user.user_id, dice, amount)
+    
+    assert not success
+    assert message == msg
+    assert bet_id is None
+    assert user.balance == balance  # Unchanged
+    assert not game_engine.game_state.active_rounds
+
+
+@pytest.mark.asyncio
+async def test_calculate_results_winning_bet(game_state, user):
+    """Test result calculation with winning bet"""
+    game_engine = GameEngine(game_state, rng=lambda a, b: 3)  # Fixed dice result
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.game_state = GameState()
-        self.game_engine = GameEngine(self.game_state)
-        
-        # Create test user
-        self.user = User.create_user(1, "testuser", "password123", 1000)
-        self.game_state.users[1] = self.user
-        self.user.current_room = 1
-    
-    def test_place_bet_success(self):
-        """Test successful bet placement"""
-        async def run_test():
-            success, message, bet_id = await self.game_engine.place_bet(1, 3, 100)
-            
-            self.assertTrue(success)
-            self.assertEqual(message, "Bet placed successfully")
-            self.assertIsNotNone(bet_id)
-            self.assertEqual(self.user.balance, 900)  # 1000 - 100
-        
-        asyncio.run(run_test())
-    
-    def test_place_bet_insufficient_balance(self):
-        """Test bet placement with insufficient balance"""
-        async def run_test():
-            # Set user balance to 50, then try to bet 100 (within max limit but exceeds balance)
-            self.user.balance = 50
-            success, message, bet_id = await self.game_engine.place_bet(1, 3, 100)
-            
-            self.assertFalse(success)
-            self.assertEqual(message, "Insufficient balance")
-            self.assertIsNone(bet_id)
-            self.assertEqual(self.user.balance, 50)  # Unchanged
-        
-        asyncio.run(run_test())
-    
-    def test_place_bet_invalid_dice_face(self):
-        """Test bet placement with invalid dice face"""
-        async def run_test():
-            success, message, bet_id = await self.game_engine.place_bet(1, 7, 100)
-            
-            self.assertFalse(success)
-            self.assertEqual(message, "Invalid dice face (must be 1-6)")
-            self.assertIsNone(bet_id)
-        
-        asyncio.run(run_test())
-    
-    def test_place_bet_invalid_amount(self):
-        """Test bet placement with invalid bet amount"""
-        async def run_test():
-            # Test amount too high
-            success, message, bet_id = await self.game_engine.place_bet(1, 3, 2000)
-            
-            self.assertFalse(success)
-            self.assertEqual(message, "Invalid bet amount (1-1000)")
-            self.assertIsNone(bet_id)
-            
-            # Test amount too low
-            success, message, bet_id = await self.game_engine.place_bet(1, 3, 0)
-            
-            self.assertFalse(success)
-            self.assertEqual(message, "Invalid bet amount (1-1000)")
-            self.assertIsNone(bet_id)
-        
-        asyncio.run(run_test())
+    # Place bet and finish betting
+    success, _, bet_id = await game_engine.place_bet(1, 3, 100)
+    assert success
     
-    @patch('random.SystemRandom.randint')
-    def test_calculate_results_winning_bet(self, mock_randint):
-        """Test result calculation with winning bet"""
-        mock_randint.return_value = 3  # Fixed dice result
-        
-        async def run_test():
-            # Place bet and finish betting
-            success, _, bet_id = await self.game_engine.place_bet(1, 3, 100)
-            self.assertTrue(success)
-            
-            # Get the round ID
-            round_id = None
-            for r in self.game_state.active_rounds.values():
-                if r.user_id == 1:
-                    round_id = r.round_id
-                    break
-            
-            self.assertIsNotNone(round_id)
-            
-            success, _ = await self.game_engine.finish_betting(1, round_id)
-            self.assertTrue(success)
-            
-            # Calculate results
-            success, message, results = await self.game_engine.calculate_results(1, round_id)
-            
-            self.assertTrue(success)
-            self.assertEqual(results['dice_result'], 3)
-            self.assertEqual(results['total_winnings'], 600)  # 100 * 6
-            self.assertEqual(results['new_balance'], 1500)  # 1000 - 100 + 600
-        
-        asyncio.run(run_test())
-    
-    def test_get_user_snapshot(self):
-        """Test getting user snapshot"""
-        async def run_test():
-            # Place a bet first
-            await self.game_engine.place_bet(1, 3, 100)
-            
-            snapshot = await self.game_engine.get_user_snapshot(1)
-            
-            self.assertIsNotNone(snapshot)
-            self.assertEqual(snapshot['user_balance'], 900)
-            self.assertEqual(len(snapshot['active_bets']), 1)
-            self.assertEqual(snapshot['current_room'], 1)
-            self.assertEqual(snapshot['round_status'], GameRoundStatus.BETTING_PHASE.value)
-        
-        asyncio.run(run_test())
-
-
-class TestGameState(unittest.TestCase):
-    """Test GameState functionality"""
-    
-    def setUp(self):
-        """Set up test fixtures"""
-        self.game_state = GameState()
-    
-    def test_user_authentication(self):
-        """Test user authentication"""
-        async def run_test():
-            # Test authentication with default user
-            user = await self.game_state.authenticate_user("testuser1", "password123")
-            self.assertIsNotNone(user)
-            self.assertEqual(user.username, "testuser1")
-            self.assertIsNotNone(user.session_token)
-            
-            # Test invalid credentials
-            user = await self.game_state.authenticate_user("testuser1", "wrongpassword")
-            self.assertIsNone(user)
-        
-        asyncio.run(run_test())
-    
-    def test_room_management(self):
-        """Test room join/leave functionality"""
-        async def run_test():
-            # Create a test user
-            user = User.create_user(100, "testuser", "password123")
-            self.game_state.users[100] = user
-            
-            # Join room
-            success = await self.game_state.join_room(100, 1)
-            self.assertTrue(success)
-            self.assertEqual(user.current_room, 1)
-            
-            room = await self.game_state.get_room(1)
-            self.assertIn(100, room.current_players)
-            
-            # Leave room
-            await self.game_state.leave_room(100)
-            self.assertIsNone(user.current_room)
-            self.assertNotIn(100, room.current_players)
-        
-        asyncio.run(run_test())
+    # Get the round ID from the per-user index
+    round_id = game_state.user_active_rounds.get(1)
+    assert round_id is not None
+    
+    success, _ = await game_engine.finish_betting(1, round_id)
+    assert success
+    
+    # Calculate results
+    success, message, results = await game_engine.calculate_results(1, round_id)
+    
+    assert success
+    assert results['dice_result'] == 3
+    assert results['total_winnings'] == 600  # 100 * 6
+    assert results['new_balance'] == 1500  # 1000 - 100 + 600
+
+
+@pytest.mark.asyncio
+async def test_get_user_snapshot(game_engine, user):
+    """Test getting user snapshot"""
+    # Place a bet first
+    await game_engine.place_bet(1, 3, 100)
+    
+    snapshot = await game_engine.get_user_snapshot(1)
+    
+    assert snapshot is not None
+    assert snapshot['user_balance'] == 900
+    assert len(snapshot['active_bets']) == 1
+    assert snapshot['current_room'] == 1
+    assert snapshot['round_status'] == GameRoundStatus.BETTING_PHASE.value
 
 
-class TestProtocolBuffers(unittest.TestCase):
-    """Test Protocol Buffers serialization/deserialization"""
+# Test GameState functionality
+@pytest.mark.asyncio
+async def test_user_authentication(game_state):
+    """Test user authentication"""
+    # Test authentication with default user
+    user = await game_state.authenticate_user("testuser1", "password123")
+    assert user is not None
+    assert user.username == "testuser1"
+    assert user.session_token is not None
+    
+    # Test invalid credentials
+    user = await game_state.authenticate_user("testuser1", "wrongpassword")
+    assert user is None
+
+
+@pytest.mark.asyncio
+async def test_room_management(game_state, make_user):
+    """Test room join/leave functionality"""
+    # Create a test user
+    user = make_user(100, "testuser")
+    game_state.users[100] = user
+    
+    # Join room
+    success = await game_state.join_room(100, 1)
+    assert success
+    assert user.current_room == 1
+    
+    room = await game_state.get_room(1)
+    assert 100 in room.current_players
+    
+    # Leave room
+    await game_state.leave_room(100)
+    assert user.current_room is None
+    assert 100 not in room.current_players
+
+
+@pytest.mark.asyncio
+async def test_game_state_reset(game_state, make_user):
+    """Test reset restores the default users and rooms"""
+    game_state.add_user(make_user(100, "extra"))
+    await game_state.join_room(1, 1)
+    await game_state.create_game_round(1)
+    
+    game_state.reset()
+    assert 100 not in game_state.users
+    assert game_state.users[1].username == "testuser1"
+    assert game_state.users[1].current_room is None
+    assert game_state.rooms[1].get_player_count() == 0
+    assert not game_state.active_rounds
+    assert await game_state.authenticate_user("testuser1", "password123") is not None
+
+
+# Test Protocol Buffers serialization/deserialization
+# Canonical messages are built once at import (keyword constructors); the tests only parse them
+_LOGIN_BYTES = pb.LoginRequest(username="testuser", password="testpass").SerializeToString()
+
+_BET_PLACEMENT_BYTES = pb.BetPlacementRequest(
+    dice_face=3, amount=100, round_id="test-round-123"
+).SerializeToString()
+
+_RECKON_RESULT_BYTES = pb.ReckonResultResponse(
+    dice_result=4,
+    total_winnings=300,
+    new_balance=1300,
+    updated_jackpot_pool=50,
+    round_id="test-round-456",
+    bet_results=[pb.BetResult(
+        bet_id="bet-123", dice_face=4, bet_amount=50, won=True, payout=300, round_id="test-round-456"
+    )],
+).SerializeToString()
+
+
+def test_login_request_serialization():
+    """Test LoginRequest message serialization"""
+    request = pb.LoginRequest()
+    request.ParseFromString(_LOGIN_BYTES)
     
-    def test_login_request_serialization(self):
-        """Test LoginRequest message serialization"""
-        request = pb.LoginRequest()
-        request.username = "testuser"
-        request.password = "testpass"
-        
-        # Serialize and deserialize
-        data = request.SerializeToString()
-        request2 = pb.LoginRequest()
-        request2.ParseFromString(data)
-        
-        self.assertEqual(request2.username, "testuser")
-        self.assertEqual(request2.password, "testpass")
-    
-    def test_bet_placement_request(self):
-        """Test BetPlacementRequest message"""
-        request = pb.BetPlacementRequest()
-        request.dice_face = 3
-        request.amount = 100
-        request.round_id = "test-round-123"
-        
-        data = request.SerializeToString()
-        request2 = pb.BetPlacementRequest()
-        request2.ParseFromString(data)
-        
-        self.assertEqual(request2.dice_face, 3)
-        self.assertEqual(request2.amount, 100)
-        self.assertEqual(request2.round_id, "test-round-123")
-    
-    def test_reckon_result_response(self):
-        """Test ReckonResultResponse message with bet results"""
-        response = pb.ReckonResultResponse()
-        response.dice_result = 4
-        response.total_winnings = 300
-        response.new_balance = 1300
-        response.updated_jackpot_pool = 50
-        response.round_id = "test-round-456"
-        
-        # Add bet results
-        bet_result = response.bet_results.add()
-        bet_result.bet_id = "bet-123"
-        bet_result.dice_face = 4
-        bet_result.bet_amount = 50
-        bet_result.won = True
-        bet_result.payout = 300
-        bet_result.round_id = "test-round-456"
-        
-        data = response.SerializeToString()
-        response2 = pb.ReckonResultResponse()
-        response2.ParseFromString(data)
-        
-        self.assertEqual(response2.dice_result, 4)
-        self.assertEqual(response2.total_winnings, 300)
-        self.assertEqual(len(response2.bet_results), 1)
-        self.assertTrue(response2.bet_results[0].won)
-
-
-class TestIntegration(unittest.TestCase):
-    """Integration tests for the complete system"""
-    
-    def setUp(self):
-        """Set up integration test environment"""
-        self.server = None
-        self.server_task = None
-        self.port = 8766  # Use different port for testing
-    
-    def tearDown(self):
-        """Clean up after integration tests"""
-        if self.server_task:
-            self.server_task.cancel()
-    
-    def test_client_server_communication(self):
-        """Test basic client-server communication"""
-        async def run_test():
-            # Start server
-            server = GameServer('localhost', self.port, 10)
-            server_task = asyncio.create_task(server.start_server())
-            
-            try:
-                # Wait a bit for server to start
-                await asyncio.sleep(0.5)
-                
-                # Create and connect client
-                client = GameClient(f"ws://localhost:{self.port}")
-                
-                if await client.connect():
-                    # Test login
-                    login_success = await client.login("testuser1", "password123")
-                    self.assertTrue(login_success)
-                    
-                    # Test joining room
-                    room_success = await client.join_room(1)
-                    self.assertTrue(room_success)
-                    
-                    # Test getting snapshot
-                    snapshot = await client.get_snapshot()
-                    self.assertIsNotNone(snapshot)
-                    self.assertEqual(snapshot['user_balance'], 1000)
-                    
-                    await client.disconnect()
-                else:
-                    self.fail("Failed to connect to server")
-                    
-            finally:
-                server_task.cancel()
-                try:
-                    await server_task
-                except asyncio.CancelledError:
-                    pass
-        
-        # Run the async test
-        asyncio.run(run_test())
-    
-    def test_complete_game_flow(self):
-        """Test a complete game flow from login to results"""
-        async def run_test():
-            # Start server
-            server = GameServer('localhost', self.port, 10)
-            server_task = asyncio.create_task(server.start_server())
-            
-            try:
-                # Wait for server to start
-                await asyncio.sleep(0.5)
-                
-                # Create client and play a game
-                client = GameClient(f"ws://localhost:{self.port}")
-                
-                if await client.connect():
-                    # Login and join room
-                    await client.login("testuser1", "password123")
-                    await client.join_room(1)
-                    
-                    # Play a complete game session
-                    bets = [(3, 100), (6, 50)]
-                    results = await client.play_game_session(bets)
-                    
-                    # Verify results
-                    self.assertIsNotNone(results)
-                    self.assertIn('dice_result', results)
-                    self.assertIn('total_winnings', results)
-                    self.assertIn('new_balance', results)
-                    self.assertEqual(len(results['bet_results']), 2)
-                    
-                    # Verify dice result is in valid range
-                    self.assertTrue(1 <= results['dice_result'] <= 6)
-                    
-                    await client.disconnect()
-                else:
-                    self.fail("Failed to connect to server")
-                    
-            finally:
-                server_task.cancel()
-                try:
-                    await server_task
-                except asyncio.CancelledError:
-                    pass
-        
-        asyncio.run(run_test())
-
-
-class TestErrorHandling(unittest.TestCase):
-    """Test error handling scenarios"""
-    
-    def setUp(self):
-        """Set up test fixtures"""
-        self.game_state = GameState()
-        self.game_engine = GameEngine(self.game_state)
-    
-    def test_invalid_user_operations(self):
-        """Test operations with invalid user IDs"""
-        async def run_test():
-            # Try to place bet with non-existent user
-            success, message, bet_id = await self.game_engine.place_bet(999, 3, 100)
-            self.assertFalse(success)
-            self.assertEqual(message, "User not found")
-            
-            # Try to get snapshot for non-existent user
-            snapshot = await self.game_engine.get_user_snapshot(999)
-            self.assertIsNone(snapshot)
-        
-        asyncio.run(run_test())
-    
-    def test_bet_validation_errors(self):
-        """Test bet validation error scenarios"""
-        async def run_test():
-            # Create test user
-            user = User.create_user(1, "testuser", "password123", 100)
-            self.game_state.users[1] = user
-            user.current_room = 1
-            
-            # Test invalid dice face
-            success, message, _ = await self.game_engine.place_bet(1, 0, 50)
-            self.assertFalse(success)
-            self.assertIn("Invalid dice face", message)
-            
-            # Test invalid bet amount (too low)
-            success, message, _ = await self.game_engine.place_bet(1, 3, 0)
-            self.assertFalse(success)
-            self.assertIn("Invalid bet amount", message)
-            
-            # Test invalid bet amount (too high)
-            success, message, _ = await self.game_engine.place_bet(1, 3, 1001)
-            self.assertFalse(success)
-            self.assertIn("Invalid bet amount", message)
-            
-            # Test insufficient balance
-            success, message, _ = await self.game_engine.place_bet(1, 3, 150)
-            self.assertFalse(success)
-            self.assertEqual(message, "Insufficient balance")
-        
-        asyncio.run(run_test())
-
-
-class TestConcurrency(unittest.TestCase):
-    """Test concurrent operations"""
-    
-    def setUp(self):
-        """Set up test fixtures"""
-        self.game_state = GameState()
-        self.game_engine = GameEngine(self.game_state)
-    
-    def test_concurrent_bet_placement(self):
-        """Test placing bets concurrently"""
-        async def run_test():
-            # Create test users
-            for i in range(5):
-                user = User.create_user(i + 1, f"user{i+1}", "password123", 1000)
-                self.game_state.users[i + 1] = user
-                user.current_room = 1
-            
-            # Place bets concurrently
-            tasks = []
-            for i in range(5):
-                task = self.game_engine.place_bet(i + 1, 3, 100)
-                tasks.append(task)
-            
-            results = await asyncio.gather(*tasks)
-            
-            # All bets should succeed
-            for success, message, bet_id in results:
-                self.assertTrue(success, f"Bet failed: {message}")
-                self.assertIsNotNone(bet_id)
-        
-        asyncio.run(run_test())
-
-
-class TestTornadoGameServer(unittest.TestCase):
-    """Test Tornado server functionality"""
-    
-    def test_tornado_server_creation(self):
-        """Test Tornado server can be created"""
-        server = TornadoGameServer(host='localhost', port=8767)
-        self.assertEqual(server.host, 'localhost')
-        self.assertEqual(server.port, 8767)
-        self.assertEqual(server.max_connections, 100)  # default
-        self.assertFalse(server.running)
-    
-    def test_tornado_server_custom_config(self):
-        """Test Tornado server with custom configuration"""
-        server = TornadoGameServer(host='0.0.0.0', port=9999, max_connections=200)
-        self.assertEqual(server.host, '0.0.0.0')
-        self.assertEqual(server.port, 9999)
-        self.assertEqual(server.max_connections, 200)
-
-
-class TestTornadoServerIntegration(unittest.TestCase):
-    """Test Tornado server integration with game engine"""
-    
-    def setUp(self):
-        """Setup test environment"""
-        self.game_state = GameState()
-        self.game_engine = GameEngine(self.game_state)
-    
-    def test_tornado_server_has_game_engine_access(self):
-        """Test that Tornado server properly integrates with game engine"""
-        # Verify that the game engine has the correct payout calculation
-        round_obj = GameRound.create_round(1, 1)
-        bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
-        round_obj.add_bet(bet)
-        
-        # Calculate results with winning dice
-        total_winnings = round_obj.calculate_results(3)
-        self.assertEqual(total_winnings, 600)  # 100 * 6 payout multiplier
-        self.assertTrue(bet.won)
-        self.assertEqual(bet.payout, 600)
-    
-    def test_tornado_server_payout_calculation_integration(self):
-        """Test complete payout calculation flow through game engine"""
-        async def run_test():
-            # Add a user to room 1
-            await self.game_state.join_room(1, 1)
-            user = self.game_state.users.get(1)
-            
-            # Place a bet
-            success, message, bet_id = await self.game_engine.place_bet(1, 3, 100)
-            self.assertTrue(success)
-            self.assertEqual(user.balance, 900)  # 1000 - 100
-            
-            # Get the round ID
-            round_id = None
-            for game_round in self.game_state.active_rounds.values():
-                if game_round.user_id == 1:
-                    round_id = game_round.round_id
-                    break
-            self.assertIsNotNone(round_id)
-            
-            # Finish betting
-            success, message = await self.game_engine.finish_betting(1, round_id)
-            self.assertTrue(success)
-            
-            # Calculate results with guaranteed win
-            with patch.object(self.game_engine.random, 'randint', return_value=3):
-                success, message, results = await self.game_engine.calculate_results(1, round_id)
-                self.assertTrue(success)
-                self.assertEqual(results['dice_result'], 3)
-                self.assertEqual(results['total_winnings'], 600)  # Correct 6x payout
-                self.assertEqual(results['new_balance'], 1500)   # 900 + 600
-                
-                # Verify bet result
-                bet_results = results['bet_results']
-                self.assertEqual(len(bet_results), 1)
-                self.assertTrue(bet_results[0]['won'])
-                self.assertEqual(bet_results[0]['payout'], 600)
-        
-        asyncio.run(run_test())
+    assert request.username == "testuser"
+    assert request.password == "testpass"
+
+
+def test_bet_placement_request():
+    """Test BetPlacementRequest message"""
+    request = pb.BetPlacementRequest()
+    request.ParseFromString(_BET_PLACEMENT_BYTES)
+    
+    assert request.dice_face == 3
+    assert request.amount == 100
+    assert request.round_id == "test-round-123"
 
 
-class TestTornadoServerPayoutFix(unittest.TestCase):
-    """Test that the Tornado server payout fix works correctly"""
+def test_reckon_result_response():
+    """Test ReckonResultResponse message with bet results"""
+    response = pb.ReckonResultResponse()
+    response.ParseFromString(_RECKON_RESULT_BYTES)
+    
+    assert response.dice_result == 4
+    assert response.total_winnings == 300
+    assert response.new_balance == 1300
+    assert response.round_id == "test-round-456"
+    assert len(response.bet_results) == 1
+    assert response.bet_results[0].won
+    assert response.bet_results[0].payout == 300
+
+
+# Integration tests for the complete system. They run over the in-memory transport;
+# test_tcp_login_smoke keeps one real WebSocket round trip through the shared game_server.
+@pytest_asyncio.fixture(scope="module", loop_scope="session")
+async def logged_in_client(inproc_server):
+    """Connect, log in and join room 1 once for all integration tests in this module"""
+    from src.game_client import GameClient
     
-    def test_tornado_server_payout_fix(self):
-        """Test that Tornado server has correct payout calculation"""
-        # This test verifies the payout bug fix by ensuring
-        # the underlying calculation is correct
-        round_obj = GameRound.create_round(1, 1)
-        bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
-        round_obj.add_bet(bet)
-        
-        # Calculate results with winning dice
-        total_winnings = round_obj.calculate_results(3)
-        self.assertEqual(total_winnings, 600)  # 100 * 6 payout multiplier
-        self.assertTrue(bet.won)
-        self.assertEqual(bet.payout, 600)
+    client = GameClient("inproc://game-server")
+    assert await client.connect_inproc(inproc_server.websocket_server.connect())
+    assert await client.login("testuser1", "password123")
+    assert await client.join_room(1)
+    
+    yield client
+    
+    await client.disconnect()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.xdist_group("server")
+async def test_tcp_login_smoke(game_server):
+    """Test login over a real WebSocket connection"""
+    from src.game_client import GameClient
+    
+    client = GameClient(f"ws://localhost:{game_server}")
+    assert await client.connect(), "Failed to connect to server"
+    try:
+        assert await client.login("testuser2", "password123")
+    finally:
+        await client.disconnect()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.xdist_group("server")
+async def test_client_server_communication(logged_in_client):
+    """Test basic client-server communication"""
+    # The snapshot must agree with the balance reported at login
+    starting_balance = logged_in_client.balance
+
+    # Test getting snapshot
+    snapshot = await logged_in_client.get_snapshot()
+    assert snapshot is not None
+    assert snapshot['current_room'] == 1
+    assert snapshot['user_balance'] == starting_balance
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.xdist_group("server")
+async def test_complete_game_flow(logged_in_client):
+    """Test a complete game flow from login to results"""
+    # Play a complete game session
+    bets = [(3, 100), (6, 50)]
+    results = await logged_in_client.play_game_session(bets)
+    
+    # Verify results
+    assert results is not None
+    assert 'dice_result' in results
+    assert 'total_winnings' in results
+    assert 'new_balance' in results
+    assert len(results['bet_results']) == 2
+    
+    # Verify dice result is in valid range
+    assert 1 <= results['dice_result'] <= 6
+
+
+# Test error handling scenarios
+@pytest.mark.asyncio
+async def test_place_bet_unknown_user(engine_with_user):
+    """Test bet placement with a non-existent user"""
+    game_engine, _ = engine_with_user
+    success, message, bet_id = await game_engine.place_bet(999, 3, 100)
+    assert not success
+    assert message == "User not found"
+    assert bet_id is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_unknown_user(engine_with_user):
+    """Test snapshot for a non-existent user"""
+    game_engine, _ = engine_with_user
+    assert await game_engine.get_user_snapshot(999) is None
+
+
+# Test concurrent operations
+@pytest.mark.asyncio
+@pytest.mark.parametrize("n_users", [5, 50, 500])
+async def test_concurrent_bet_placement(game_engine, game_state, make_user, n_users):
+    """Test placing bets concurrently"""
+    # Create test users up front so only the bets themselves run concurrently
+    users = [make_user(i + 1, f"user{i+1}", 1000) for i in range(n_users)]
+    game_state.users.update({u.user_id: u for u in users})
+    for u in users:
+        u.current_room = 1
+    
+    # Place bets concurrently
+    results = await asyncio.gather(*(game_engine.place_bet(u.user_id, 3, 100) for u in users))
+    
+    # All bets should succeed
+    for success, message, bet_id in results:
+        assert success, f"Bet failed: {message}"
+        assert bet_id is not None
+
+
+@pytest.mark.asyncio
+async def test_client_receive_message_returns_bytes():
+    """Test that receive_message hands back the payload as bytes, including reassembled frames"""
+    from src.game_client import GameClient
+    
+    response = pb.LoginResponse()
+    response.success = True
+    response.message = "Login successful"
+    payload = response.SerializeToString()
+    frame = struct.pack('<II', 0x1001, len(payload)) + payload
+    
+    class FrameSocket:
+        def __init__(self, chunks):
+            self.chunks = list(chunks)
+        
+        async def recv(self):
+            return self.chunks.pop(0)
+    
+    client = GameClient("ws://localhost:8765")
+    for chunks in ([frame], [frame[:10], frame[10:]]):
+        client.websocket = FrameSocket(chunks)
+        message = await client.receive_message()
+        assert message['command_id'] == 0x1001
+        assert type(message['payload']) is bytes
+        assert message['payload'] == payload
+
+
+@pytest.mark.asyncio
+async def test_server_error_frames_cache_only_fixed_messages():
+    """Test that dynamic error messages are encoded per call and never cached"""
+    from src import game_server
+    
+    class RecordingSocket:
+        def __init__(self):
+            self.frames = []
+        
+        async def send(self, frame):
+            self.frames.append(frame)
+    
+    websocket = RecordingSocket()
+    server = game_server.GameServer('localhost', 8765, 10)
+    cached = dict(game_server._ERROR_FRAMES)
+    
+    await server.send_error(websocket, game_server.ERROR_AUTH_REQUIRED, "Authentication required")
+    await server.send_error(websocket, game_server.ERROR_SERVER_ERROR, "Server error: boom")
+    
+    assert websocket.frames[0] is cached[(game_server.ERROR_AUTH_REQUIRED, "Authentication required")]
+    error = pb.ErrorResponse()
+    error.ParseFromString(websocket.frames[1][8:])
+    assert error.error_code == game_server.ERROR_SERVER_ERROR
+    assert error.error_message == "Server error: boom"
+    assert game_server._ERROR_FRAMES == cached
+
+
+# Test Tornado server functionality
+def test_tornado_server_creation():
+    """Test Tornado server can be created"""
+    server = TornadoGameServer(host='localhost', port=8767)
+    assert server.host == 'localhost'
+    assert server.port == 8767
+    assert server.max_connections == 100  # default
+    assert not server.running
+
+
+def test_tornado_server_custom_config():
+    """Test Tornado server with custom configuration"""
+    server = TornadoGameServer(host='0.0.0.0', port=9999, max_connections=200)
+    assert server.host == '0.0.0.0'
+    assert server.port == 9999
+    assert server.max_connections == 200
+
+
+# Test Tornado server integration with game engine
+def test_tornado_server_has_game_engine_access():
+    """Test that Tornado server properly integrates with game engine"""
+    # Verify that the game engine has the correct payout calculation
+    round_obj = GameRound.create_round(1, 1)
+    bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
+    round_obj.add_bet(bet)
+    
+    # Calculate results with winning dice
+    total_winnings = round_obj.calculate_results(3)
+    assert total_winnings == 600  # 100 * 6 payout multiplier
+    assert bet.won
+    assert bet.payout == 600
+
+
+@pytest.mark.asyncio
+async def test_tornado_server_payout_calculation_integration(game_state, make_user):
+    """Test complete payout calculation flow through game engine"""
+    game_engine = GameEngine(game_state, rng=lambda a, b: 3)  # Guaranteed win
+    
+    # Add a user with a known balance to room 1
+    user = make_user(1, "testuser", 1000)
+    game_state.users[1] = user
+    await game_state.join_room(1, 1)
+    
+    # Place a bet
+    success, message, bet_id = await game_engine.place_bet(1, 3, 100)
+    assert success
+    assert user.balance == 900  # 1000 - 100
+    
+    # Get the round ID from the per-user index
+    round_id = game_state.user_active_rounds.get(1)
+    assert round_id is not None
+    
+    # Finish betting
+    success, message = await game_engine.finish_betting(1, round_id)
+    assert success
+    
+    # Calculate results with guaranteed win
+    success, message, results = await game_engine.calculate_results(1, round_id)
+    assert success
+    assert results['dice_result'] == 3
+    assert results['total_winnings'] == 600  # Correct 6x payout
+    assert results['new_balance'] == 1500   # 900 + 600
+    
+    # Verify bet result
+    bet_results = results['bet_results']
+    assert len(bet_results) == 1
+    assert bet_results[0]['won']
+    assert bet_results[0]['payout'] == 600
+
+
+# Test that the Tornado server payout fix works correctly
+def test_tornado_server_payout_fix():
+    """Test that Tornado server has correct payout calculation"""
+    # This test verifies the payout bug fix by ensuring
+    # the underlying calculation is correct
+    round_obj = GameRound.create_round(1, 1)
+    bet = BetData.create_bet(1, round_obj.round_id, 3, 100)
+    round_obj.add_bet(bet)
+    
+    # Calculate results with winning dice
+    total_winnings = round_obj.calculate_results(3)
+    assert total_winnings == 600  # 100 * 6 payout multiplier
+    assert bet.won
+    assert bet.payout == 600
 
 
 def run_all_tests():
     """Run all test suites"""
-    test_suites = [
-        TestUser,
-        TestRoom, 
-        TestGameRound,
-        TestGameEngine,
-        TestGameState,
-        TestProtocolBuffers,
-        TestErrorHandling,
-        TestConcurrency,
-        TestTornadoGameServer,
-        TestTornadoServerIntegration,
-        TestTornadoServerPayoutFix,
-        TestIntegration  # Run integration tests last
-    ]
-    
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    for test_class in test_suites:
-        tests = loader.loadTestsFromTestCase(test_class)
-        suite.addTests(tests)
-    
-    runner = unittest.TextTestRunner(verbosity=2)
-    result = runner.run(suite)
-    
-    return result.wasSuccessful()
+    return pytest.main([__file__, "-v"]) == 0
 
 
 if __name__ == '__main__':
@@ -669,4 +617,4 @@ if __name__ == '__main__':
         print("\n🎉 All tests passed!")
     else:
         print("\n❌ Some tests failed!")
-        exit(1)
\ No newline at end of file
+        exit(1)
@@ -1,21 +1,15 @@
 import asyncio
-import threading
-import time
-import websockets
+import logging
+import logging.handlers
+import struct
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
 
 # Import our modules
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-
-from src.models import User, Room, GameRound, BetData, GameState, GameRoundStatus
+from src.models import User, Room, GameRound, BetData, GameState, GameRoundStatus, _discard_idle_lock
 from src.game_engine import GameEngine
-from src.game_server import GameServer
-from src.tornado_game_server import TornadoGameServer, GameWebSocketHandler
-from src.game_client import GameClient
+from src import tornado_game_server
+from src.tornado_game_server import TornadoGameServer, GameWebSocketHandler, ERROR_INVALID_FORMAT
 from proto import game_messages_pb2 as pb
 
 
@@ -32,9 +26,11 @@ def test_create_user():
     assert not user.verify_password("wrongpassword")
 
 
-def test_session_token_generation():
+def test_session_token_generation(make_user, monkeypatch):
     """Test session token generation and validation"""
-    user = User.create_user(1, "testuser", "password123")
+    clock = [1000.0]
+    monkeypatch.setattr(User, "_now", staticmethod(lambda: clock[0]))
+    user = make_user(1, "testuser")
     
     token = user.generate_session_token()
     assert token is not None
@@ -42,7 +38,7 @@ def test_session_token_generation():
     assert not user.is_session_expired()
     
     # Test expired session
-    user.last_activity = datetime.now() - timedelta(seconds=1801)
+    clock[0] += 1801
     assert user.is_session_expired()
 
 
@@ -92,11 +88,8 @@ def test_game_round_add_bet():
     assert round_obj.bets[0].amount == 100
 
 
-@patch('random.SystemRandom.randint')
-def test_game_round_calculate_results(mock_randint):
+def test_game_round_calculate_results():
     """Test result calculation for game round"""
-    mock_randint.return_value = 3  # Fixed dice result
-    
     round_obj = GameRound.create_round(1, 1)
     bet1 = BetData.create_bet(1, round_obj.round_id, 3, 100)  # Will win
     bet2 = BetData.create_bet(1, round_obj.round_id, 6, 50)   # Will lose
@@ -113,17 +106,35 @@ def test_game_round_calculate_results(mock_randint):
     assert bet2.payout == 0
 
 
+def test_game_round_results_without_add_bet():
+    """Test that bets handed to the constructor are counted in the round total"""
+    bet1 = BetData.create_bet(1, "round-1", 3, 100)
+    bet2 = BetData.create_bet(1, "round-1", 3, 20)
+    round_obj = GameRound(round_id="round-1", user_id=1, room_id=1, bets=[bet1, bet2])
+    
+    assert round_obj.calculate_results(3) == 720
+    assert round_obj.total_winnings == 720
+    assert bet1.payout + bet2.payout == 720
+
+
 # Fixtures for GameEngine tests
+@pytest.fixture(scope="module")
+def shared_game_state():
+    """Build one game state per module; tests get it reset through game_state"""
+    return GameState()
+
+
 @pytest.fixture
-def game_state():
-    """Create a game state with test data"""
-    state = GameState()
+def game_state(shared_game_state, make_user):
+    """Reset the shared game state and add test data"""
+    state = shared_game_state
+    state.reset()
     
     # Add test users
-    user1 = User.create_user(1, "testuser1", "password123", 1000)
-    user2 = User.create_user(2, "testuser2", "password123", 1000)
-    state.users[1] = user1
-    state.users[2] = user2
+    user1 = make_user(1, "testuser1", 1000)
+    user2 = make_user(2, "testuser2", 1000)
+    state.add_user(user1)
+    state.add_user(user2)
     
     # Add test rooms
     room1 = Room(1, "Test Room 1")
@@ -177,38 +188,24 @@ async def test_place_bet_insufficient_balance(game_engine, user, game_state):
 
 
 @pytest.mark.asyncio
-async def test_place_bet_invalid_dice_face(game_engine):
-    """Test bet placement with invalid dice face"""
-    success, message, bet_id = await game_engine.place_bet(1, 7, 100)
-    
-    assert not success
-    assert message == "Invalid dice face (must be 1-6)"
-    assert bet_id is None
-
-
-@pytest.mark.asyncio
-async def test_place_bet_invalid_amount(game_engine):
-    """Test bet placement with invalid bet amount"""
-    # Test amount too high
-    success, message, bet_id = await game_engine.place_bet(1, 3, 2000)
-    
-    assert not success
-    assert message == "Invalid bet amount (1-1000)"
-    assert bet_id is None
-    
-    # Test amount too low
-    success, message, bet_id = await game_engine.place_bet(1, 3, 0)
+@pytest.mark.parametrize("dice_face,amount,expected_message", [
+    pytest.param(7, 100, "Invalid dice face (must be 1-6)", id="dice-face"),
+    pytest.param(3, 2000, "Invalid bet amount (1-1000)", id="amount-too-high"),
+    pytest.param(3, 0, "Invalid bet amount (1-1000)", id="amount-too-low"),
+])
+async def test_place_bet_invalid_input(game_engine, dice_face, amount, expected_message):
+    """Test bet placement with an invalid dice face or bet amount"""
+    success, message, bet_id = await game_engine.place_bet(1, dice_face, amount)
     
     assert not success
-    assert message == "Invalid bet amount (1-1000)"
+    assert message == expected_message
     assert bet_id is None
 
 
 @pytest.mark.asyncio
-@patch('random.SystemRandom.randint')
-async def test_calculate_results_winning_bet(mock_randint, game_engine, game_state):
+async def test_calculate_results_winning_bet(game_state):
     """Test result calculation with winning bet"""
-    mock_randint.return_value = 3  # Fixed dice result
+    game_engine = GameEngine(game_state, rng=lambda a, b: 3)  # Fixed dice result
     
     # User needs to join a room first
     await game_state.join_room(1, 1)
@@ -217,10 +214,10 @@ async def test_calculate_results_winning_bet(mock_randint, game_engine, game_sta
     success, message, bet_id = await game_engine.place_bet(1, 3, 100)
     assert success, f"Expected success but got: {message}"
     
-    # Get the round ID from active rounds
-    user_rounds = [r for r in game_engine.game_state.active_rounds.values() if r.user_id == 1]
-    assert len(user_rounds) == 1
-    round_id = user_rounds[0].round_id
+    # Get the round ID from the per-user index
+    round_id = game_state.user_active_rounds.get(1)
+    assert round_id is not None
+    assert game_state.active_rounds[round_id].user_id == 1
     
     # Finish betting
     success, message = await game_engine.finish_betting(1, round_id)
@@ -253,6 +250,61 @@ async def test_get_user_snapshot(game_engine, game_state):
     assert snapshot['active_bets'][0]['amount'] == 100
 
 
+@pytest.mark.asyncio
+async def test_fill_snapshot(game_engine, game_state):
+    """Test snapshot response is filled straight from game state"""
+    await game_state.join_room(1, 1)
+    success, message, bet_id = await game_engine.place_bet(1, 3, 100)
+    assert success, f"Expected success but got: {message}"
+    
+    response = await game_engine.fill_snapshot(pb.SnapshotResponse(), 1)
+    assert response.user_balance == 900
+    assert response.current_room == 1
+    assert response.round_status == GameRoundStatus.BETTING_PHASE.value
+    assert len(response.active_bets) == 1
+    assert response.active_bets[0].bet_id == bet_id
+    assert response.active_bets[0].dice_face == 3
+    
+    assert await game_engine.fill_snapshot(pb.SnapshotResponse(), 999) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reports_latest_round(game_engine, game_state):
+    """Test that a user with two active rounds is snapshotted from the latest one"""
+    await game_state.join_room(1, 1)
+    
+    # Nine bets fill the first round; the tenth rolls over into a second round
+    bet_ids = []
+    for _ in range(10):
+        success, message, bet_id = await game_engine.place_bet(1, 3, 10)
+        assert success, f"Expected success but got: {message}"
+        bet_ids.append(bet_id)
+    
+    rounds = [r for r in game_state.active_rounds.values() if r.user_id == 1]
+    assert len(rounds) == 2
+    first_round, latest_round = rounds
+    assert first_round.status == GameRoundStatus.WAITING_RESULTS
+    assert len(first_round.bets) == 9
+    assert game_state.user_active_rounds[1] == latest_round.round_id
+    
+    snapshot = await game_engine.get_user_snapshot(1)
+    assert snapshot['round_status'] == GameRoundStatus.BETTING_PHASE.value
+    assert [bet['bet_id'] for bet in snapshot['active_bets']] == bet_ids[9:]
+    
+    response = await game_engine.fill_snapshot(pb.SnapshotResponse(), 1)
+    assert [bet.bet_id for bet in response.active_bets] == bet_ids[9:]
+    
+    # Settling the older round leaves the index on the latest round
+    success, message, results = await game_engine.calculate_results(1, first_round.round_id)
+    assert success, message
+    assert game_state.user_active_rounds[1] == latest_round.round_id
+    
+    await game_state.finish_game_round(latest_round.round_id)
+    snapshot = await game_engine.get_user_snapshot(1)
+    assert snapshot['round_status'] == GameRoundStatus.NO_ACTIVE_ROUND.value
+    assert snapshot['active_bets'] == []
+
+
 # Test GameState functionality
 @pytest.mark.asyncio
 async def test_authenticate_user(game_state):
@@ -272,6 +324,35 @@ async def test_authenticate_user(game_state):
     assert user is None
 
 
+@pytest.mark.asyncio
+async def test_authenticate_user_uses_verification_cache(game_state):
+    """Test a repeat login skips bcrypt while wrong passwords are still rejected"""
+    user = await game_state.authenticate_user("testuser1", "password123")
+    game_state.invalidate_session(user)
+    
+    with patch.object(User, 'verify_password', side_effect=AssertionError("bcrypt should not run")):
+        assert await game_state.authenticate_user("testuser1", "password123") is user
+    
+    game_state.invalidate_session(user)
+    assert await game_state.authenticate_user("testuser1", "wrongpassword") is None
+
+
+@pytest.mark.asyncio
+async def test_verification_cache_evicts_least_recently_used(game_state, monkeypatch):
+    """Test a full verification cache drops the login that was used longest ago"""
+    monkeypatch.setattr("src.models.AUTH_CACHE_MAX_ENTRIES", 2)
+    for username, password in (("testuser1", "password123"), ("testuser2", "password123"),
+                               ("testuser1", "password123"), ("alice", "alicepass")):
+        user = await game_state.authenticate_user(username, password)
+        game_state.invalidate_session(user)
+
+    with patch.object(User, 'verify_password', side_effect=AssertionError("bcrypt should not run")):
+        assert await game_state.authenticate_user("testuser1", "password123") is not None
+    with patch.object(User, 'verify_password', return_value=False) as verify:
+        assert await game_state.authenticate_user("testuser2", "password123") is None
+        verify.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_join_room(game_state):
     """Test room joining functionality"""
@@ -291,6 +372,58 @@ async def test_join_room(game_state):
     assert 1 in game_state.rooms[2].current_players
 
 
+@pytest.mark.asyncio
+async def test_remove_connection_leaves_room(game_state):
+    """Test disconnect cleanup leaves the room and ends the session"""
+    user = await game_state.authenticate_user("testuser1", "password123")
+    websocket = Mock(spec=[])
+    await game_state.add_connection(websocket, user.user_id)
+    await game_state.join_room(user.user_id, 1)
+    assert game_state.get_user_by_connection(websocket) is user
+    
+    await asyncio.wait_for(game_state.remove_connection(websocket), timeout=5)
+    assert user.current_room is None
+    assert user.user_id not in game_state.rooms[1].current_players
+    assert user.session_token is None
+    assert websocket not in game_state.connections
+    assert game_state.get_user_by_connection(websocket) is None
+    
+    # Neither the user's lock nor the emptied room's lock outlives the connection
+    assert user.user_id not in game_state._user_locks
+    assert 1 not in game_state._room_locks
+
+
+@pytest.mark.asyncio
+async def test_room_lock_kept_while_room_occupied(game_state):
+    """Test that leaving a room drops its lock only once the last player is gone"""
+    await game_state.join_room(1, 1)
+    await game_state.join_room(2, 1)
+    
+    await game_state.leave_room(1)
+    assert 1 in game_state._room_locks
+    
+    # Moving the last player to another room releases the first room's lock
+    await game_state.join_room(2, 2)
+    assert 1 not in game_state._room_locks
+    assert 2 in game_state._room_locks
+
+
+@pytest.mark.asyncio
+async def test_busy_user_lock_is_not_dropped(game_state):
+    """Test that a user lock is dropped only once nobody holds or waits on it"""
+    async with game_state._user_locks[1]:
+        _discard_idle_lock(game_state._user_locks, 1)
+        assert 1 in game_state._user_locks
+    
+    # Session cleanup queued behind the held lock drops it once it gets through
+    async with game_state._user_locks[1]:
+        cleanup = asyncio.create_task(game_state.end_user_session(1))
+        await asyncio.sleep(0)
+        assert 1 in game_state._user_locks
+    await asyncio.wait_for(cleanup, timeout=5)
+    assert 1 not in game_state._user_locks
+
+
 @pytest.mark.asyncio
 async def test_create_game_round(game_state):
     """Test game round creation"""
@@ -302,6 +435,12 @@ async def test_create_game_round(game_state):
     assert round_obj.user_id == 1
     assert round_obj.status == GameRoundStatus.BETTING_PHASE
     assert round_obj.round_id in game_state.active_rounds
+    assert game_state.user_active_rounds[1] == round_obj.round_id
+    
+    # Existing betting-phase round is reused, and finishing it clears the index
+    assert await game_state.create_game_round(1) is round_obj
+    await game_state.finish_game_round(round_obj.round_id)
+    assert 1 not in game_state.user_active_rounds
 
 
 # Integration tests would go here, but they require more complex setup
@@ -336,6 +475,19 @@ def test_protocol_messages():
 
 
 # Tornado Server Tests
+@pytest.fixture
+def tornado_handler():
+    """Create a Tornado handler without a connection, recording the errors it sends"""
+    handler = GameWebSocketHandler.__new__(GameWebSocketHandler)
+    handler.game_state = GameState()
+    handler.user_id = 0
+    handler.authenticated = False
+    handler._rate_limits = {}
+    handler.errors = []
+    handler.send_error = lambda code, message: handler.errors.append((code, message))
+    return handler
+
+
 class TestTornadoGameServer:
     """Test Tornado server functionality"""
     
@@ -354,6 +506,72 @@ class TestTornadoGameServer:
         assert server.port == 9999
         assert server.max_connections == 200
 
+    def test_tornado_log_listener_detaches_queue_handler(self):
+        """Test that stopping the log listener removes its queue handler from the root logger"""
+        root = logging.getLogger()
+        level = root.level
+        try:
+            tornado_game_server.start_log_listener()
+            tornado_game_server.start_log_listener()  # Second start is a no-op
+            queue_handlers = [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]
+            assert len(queue_handlers) == 1
+            
+            tornado_game_server.stop_log_listener()
+            tornado_game_server.stop_log_listener()  # Second stop is a no-op
+            assert not any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
+        finally:
+            tornado_game_server.stop_log_listener()
+            root.setLevel(level)
+    
+    @pytest.mark.asyncio
+    async def test_tornado_handler_rejects_corrupt_protobuf(self, tornado_handler):
+        """Test that a corrupt payload is reported as an invalid protobuf message"""
+        await tornado_handler.handle_login(b'\x0a\x05ab')  # Truncated username field
+        assert tornado_handler.errors == [(ERROR_INVALID_FORMAT, "Invalid protobuf message")]
+
+    def test_tornado_process_message_rejects_truncated_frames(self, tornado_handler):
+        """Test that short headers and truncated payloads are rejected before dispatch"""
+        tornado_handler.process_message(b'\x01\x00\x00')  # Shorter than the 8-byte header
+        tornado_handler.process_message(struct.pack('<II', 0x0001, 10) + b'abc')  # Payload cut short
+        assert tornado_handler.errors == [
+            (ERROR_INVALID_FORMAT, "Invalid packet size"),
+            (ERROR_INVALID_FORMAT, "Packet length mismatch"),
+        ]
+    
+    def test_tornado_rate_limit_rejects_and_refills(self, tornado_handler, monkeypatch):
+        """Test that the token bucket rejects a burst past capacity and refills over time"""
+        clock = [100.0]
+        monkeypatch.setattr("src.tornado_game_server.time.monotonic", lambda: clock[0])
+        tornado_handler.RATE_LIMIT_ENABLED = True
+        capacity = int(tornado_handler.RATE_LIMIT_CAPACITY)
+        
+        assert all(tornado_handler.check_rate_limit(2) for _ in range(capacity))
+        assert not tornado_handler.check_rate_limit(2)
+        
+        # Tokens refill at REFILL_PER_SEC; one and a half tokens admit exactly one message
+        clock[0] += 1.5 / tornado_handler.RATE_LIMIT_REFILL_PER_SEC
+        assert tornado_handler.check_rate_limit(2)
+        assert not tornado_handler.check_rate_limit(2)
+        
+        # A long idle period refills only up to capacity
+        clock[0] += 60.0
+        assert all(tornado_handler.check_rate_limit(2) for _ in range(capacity))
+        assert not tornado_handler.check_rate_limit(2)
+    
+    def test_tornado_rate_limit_capacity_override(self, tornado_handler, monkeypatch):
+        """Test that users with a capacity override are not throttled at the default capacity"""
+        monkeypatch.setattr("src.tornado_game_server.time.monotonic", lambda: 100.0)
+        tornado_handler.RATE_LIMIT_ENABLED = True
+        
+        assert all(tornado_handler.check_rate_limit(1) for _ in range(1000))
+        assert all(tornado_handler.check_rate_limit(2) for _ in range(20))
+        assert not tornado_handler.check_rate_limit(2)
+    
+    def test_tornado_rate_limit_disabled_by_default(self, tornado_handler):
+        """Test that the rate limiter admits every message while disabled"""
+        assert all(tornado_handler.check_rate_limit(2) for _ in range(1000))
+        assert tornado_handler._rate_limits == {}
+
 
 class TestTornadoServerIntegration:
     """Test Tornado server integration with game engine"""
@@ -361,7 +579,7 @@ class TestTornadoServerIntegration:
     def setup_method(self):
         """Setup test environment"""
         self.game_state = GameState()
-        self.game_engine = GameEngine(self.game_state)
+        self.game_engine = GameEngine(self.game_state, rng=lambda a, b: 3)  # Guaranteed win
     
     def test_tornado_server_has_game_engine_access(self):
         """Test that Tornado server properly integrates with game engine"""
@@ -377,23 +595,20 @@ class TestTornadoServerIntegration:
         assert bet.payout == 600
     
     @pytest.mark.asyncio
-    async def test_tornado_server_payout_calculation_integration(self):
+    async def test_tornado_server_payout_calculation_integration(self, make_user):
         """Test complete payout calculation flow through game engine"""
-        # Add a user to room 1
+        # Add a user with a known balance to room 1
+        user = make_user(1, "testuser", 1000)
+        self.game_state.users[1] = user
         await self.game_state.join_room(1, 1)
-        user = self.game_state.users.get(1)
         
         # Place a bet
         success, message, bet_id = await self.game_engine.place_bet(1, 3, 100)
         assert success
         assert user.balance == 900  # 1000 - 100
         
-        # Get the round ID
-        round_id = None
-        for game_round in self.game_state.active_rounds.values():
-            if game_round.user_id == 1:
-                round_id = game_round.round_id
-                break
+        # Get the round ID from the per-user index
+        round_id = self.game_state.user_active_rounds.get(1)
         assert round_id is not None
         
         # Finish betting
@@ -401,18 +616,17 @@ class TestTornadoServerIntegration:
         assert success
         
         # Calculate results with guaranteed win
-        with patch.object(self.game_engine.random, 'randint', return_value=3):
-            success, message, results = await self.game_engine.calculate_results(1, round_id)
-            assert success
-            assert results['dice_result'] == 3
-            assert results['total_winnings'] == 600  # Correct 6x payout
-            assert results['new_balance'] == 1500   # 900 + 600
-            
-            # Verify bet result
-            bet_results = results['bet_results']
-            assert len(bet_results) == 1
-            assert bet_results[0]['won'] == True
-            assert bet_results[0]['payout'] == 600
+        success, message, results = await self.game_engine.calculate_results(1, round_id)
+        assert success
+        assert results['dice_result'] == 3
+        assert results['total_winnings'] == 600  # Correct 6x payout
+        assert results['new_balance'] == 1500   # 900 + 600
+        
+        # Verify bet result
+        bet_results = results['bet_results']
+        assert len(bet_results) == 1
+        assert bet_results[0]['won'] == True
+        assert bet_results[0]['payout'] == 600
 
 
 def test_tornado_server_payout_fix():